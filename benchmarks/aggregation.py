@@ -0,0 +1,44 @@
+# benchmarks/aggregation.py
+# Compare the per-key FedAvg loop with the flat-buffer aggregate_updates.
+# Run from the repository root:  python -m benchmarks.aggregation [client counts...]
+import sys
+import time
+import torch
+from model import initialize_model, aggregate_updates
+from update_store import share_update, top_k
+
+# fraction of entries kept by the sparse (top-k delta) case
+TOPK_RATIO = 0.01
+
+
+def aggregate_per_key(model_updates):
+    """The original implementation: one Python sum() with temporaries per key."""
+    num_samples = sum(s for _, _, _, s in model_updates)
+    agg = dict(model_updates[0][1])
+    for key in agg.keys():
+        agg[key] = sum(update[1][key] * update[3] for update in model_updates) / num_samples
+    return agg
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [10, 100, 1000]
+    template = initialize_model().state_dict()
+    model_bytes = sum(t.numel() * t.element_size() for t in template.values())
+    print(f"model size: {model_bytes / 1024:.1f} KiB")
+
+    for n in counts:
+        updates = [(i, share_update({k: torch.randn_like(v) for k, v in template.items()}), 0.0, 100 + i)
+                   for i in range(n)]
+        sparse = [(i, top_k(u, TOPK_RATIO), c, s) for i, u, c, s in updates]
+        ref, t_ref = timed(aggregate_per_key, updates)
+        out, t_flat = timed(aggregate_updates, updates)
+        _, t_sparse = timed(aggregate_updates, sparse)
+        err = max((ref[k] - out[k]).abs().max().item() for k in ref)
+        print(f"{n:5d} clients | per-key {t_ref * 1000:8.1f} ms | flat {t_flat * 1000:8.1f} ms "
+              f"| {t_ref / t_flat:5.1f}x | max err {err:.2e} | top-{TOPK_RATIO:.0%} sparse {t_sparse * 1000:8.1f} ms")
@@ -0,0 +1,52 @@
+# benchmarks/client_training.py
+# Round throughput of ClientExecutor on synthetic MNIST-shaped shards.
+# Run from the repository root:  python -m benchmarks.client_training [client counts...]
+import os
+import sys
+import time
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from client import Client
+from client_executor import ClientExecutor
+from config import Config
+
+SAMPLES_PER_CLIENT = 200
+# clients per vmapped cohort, trained in-process
+COHORT_SIZE = 50
+
+
+def make_clients(n, config):
+    clients = []
+    for i in range(n):
+        data = torch.rand(SAMPLES_PER_CLIENT, 1, 28, 28)
+        target = torch.randint(0, 10, (SAMPLES_PER_CLIENT,))
+        loader = DataLoader(TensorDataset(data, target), batch_size=config.batch_size, shuffle=True)
+        clients.append(Client(i, loader, config))
+    return clients
+
+
+def run_round(clients, num_workers, config, cohort_size=1):
+    executor = ClientExecutor(clients, num_workers, config.threads_per_worker, cohort_size)
+    start = time.perf_counter()
+    samples = sum(sample_count for _, _, _, sample_count in executor.train_round())
+    elapsed = time.perf_counter() - start
+    executor.close()
+    return samples / elapsed, elapsed
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [5, 50, 500]
+    config = Config()
+    workers = max(1, (os.cpu_count() or 1) // config.threads_per_worker)
+
+    # first-touch costs (allocator, kernels) would otherwise land on the first sequential run
+    run_round(make_clients(2, config), 1, config)
+
+    for n in counts:
+        clients = make_clients(n, config)
+        seq_rate, seq_time = run_round(clients, 1, config)
+        par_rate, par_time = run_round(clients, workers, config)
+        cohort_rate, cohort_time = run_round(clients, 1, config, COHORT_SIZE)
+        print(f"{n:4d} clients | sequential {seq_rate:8.0f} samples/s ({seq_time:6.1f}s) "
+              f"| {workers} workers {par_rate:8.0f} samples/s ({par_time:6.1f}s) | {par_rate / seq_rate:4.1f}x "
+              f"| cohorts of {COHORT_SIZE} {cohort_rate:8.0f} samples/s ({cohort_time:6.1f}s) | {cohort_rate / seq_rate:4.1f}x")
@@ -0,0 +1,29 @@
+# benchmarks/data_loading.py
+# One client epoch of batches: per-sample DataLoader vs the vectorized ShardLoader.
+# Uses the MNIST test split from data/MNIST/raw, which ships with the repository.
+# Run from the repository root:  python -m benchmarks.data_loading [shard sizes...]
+import sys
+import time
+import torch
+from torch.utils.data import DataLoader
+from dataset import load_mnist_tensors, ShardDataset, ShardLoader
+
+BATCH_SIZE = 20
+
+
+def epoch_time(loader):
+    start = time.perf_counter()
+    for data, target in loader:
+        pass
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    images, labels = load_mnist_tensors(train=False)
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000]
+    for n in sizes:
+        shard = ShardDataset(images, labels, torch.randperm(len(labels))[:n])
+        t_sample = epoch_time(DataLoader(shard, batch_size=BATCH_SIZE, shuffle=True))
+        t_shard = epoch_time(ShardLoader(shard, batch_size=BATCH_SIZE, shuffle=True))
+        print(f"{n:6d} samples | per-sample {t_sample * 1000:8.1f} ms | sliced {t_shard * 1000:8.1f} ms "
+              f"| {t_sample / t_shard:5.1f}x")
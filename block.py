@@ -50,9 +50,12 @@
 import hashlib
 import json
 import time
+from merkle import MerkleTree, update_digest
+from model import aggregate_updates, aggregate_cache
 
 class Block:
-    def __init__(self, miner_id, model_updates, previous_hash, nonce=0, timestamp=None):
+    def __init__(self, miner_id, model_updates, previous_hash, nonce=0, timestamp=None, merkle_root=None,
+                 difficulty=None):
         self.miner_id = miner_id
         # list of tuples: (client_id, update_dict, comp_time, sample_count)
         self.model_updates = model_updates
@@ -60,6 +63,41 @@ class Block:
         self.nonce = nonce
         self.timestamp = timestamp
         self.hash = None  # will be set after successful PoW
+        # Merkle root over update digests; None for blocks that predate update commitments
+        self.merkle_root = merkle_root
+        # hash prefix the block was mined against; None for blocks that predate it
+        self.difficulty = difficulty
+        self._leaves = None
+        # set once the payload is released; model_updates is then read back through it on demand
+        self.payload_loader = None
+
+    @property
+    def model_updates(self):
+        if self._model_updates is None and self.payload_loader is not None:
+            # loaded per access and not kept, so released blocks stay header-only in memory
+            return self.payload_loader()
+        return self._model_updates
+
+    @model_updates.setter
+    def model_updates(self, updates):
+        self._model_updates = updates
+
+    def release_payload(self, loader):
+        """Drop model_updates from memory; `loader()` must return them again when needed."""
+        self.payload_loader = loader
+        self._model_updates = None
+
+    def header_record(self):
+        """Hashed header fields plus the hash itself, as stored on disk."""
+        return dict(self.header(), hash=self.hash)
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild a header-only block from header_record() output."""
+        block = cls(record['miner_id'], None, record['previous_hash'], record['nonce'], record['timestamp'],
+                    merkle_root=record.get('merkle_root'), difficulty=record.get('difficulty'))
+        block.hash = record['hash']
+        return block
 
     def to_dict(self):
         return {
@@ -68,26 +106,98 @@ class Block:
             "nonce": self.nonce,
             "hash": self.hash,
             "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root,
+            "difficulty": self.difficulty,
             "num_updates": len(self.model_updates),
             "clients": [uid for uid, *_ in self.model_updates]
         }
 
-    def compute_hash(self):
-        data = json.dumps({
+    def header(self):
+        """Header fields covered by the block hash."""
+        header = {
             'miner_id': self.miner_id,
             'previous_hash': self.previous_hash,
             'nonce': self.nonce,
             'timestamp': self.timestamp
-        }, sort_keys=True).encode()
+        }
+        # left out when unset so blocks mined before these fields existed keep their hash
+        if self.merkle_root is not None:
+            header['merkle_root'] = self.merkle_root
+        if self.difficulty is not None:
+            header['difficulty'] = self.difficulty
+        return header
+
+    def leaf_digests(self):
+        """Per-update digests, computed once and cached."""
+        if self._leaves is None:
+            self._leaves = [update_digest(u) for u in self.model_updates]
+        return self._leaves
+
+    def compute_merkle_root(self):
+        """Commit model_updates into the header. Call once before PoW."""
+        self.merkle_root = MerkleTree(self.leaf_digests()).root
+        return self.merkle_root
+
+    def merkle_proof(self, index):
+        """Return (leaf_digest, proof) for model_updates[index]; check with merkle.verify_proof."""
+        leaves = self.leaf_digests()
+        return leaves[index], MerkleTree(leaves).proof(index)
+
+    def compute_hash(self):
+        data = json.dumps(self.header(), sort_keys=True).encode()
         return hashlib.sha256(data).hexdigest()
 
+    def nonce_hasher(self):
+        """Return a NonceHasher over this block's header with the nonce left open."""
+        return NonceHasher(self.header())
+
+    def aggregate(self):
+        """Return the block's aggregated global model, computed at most once per hash."""
+        return aggregate_cache.get(self.hash, lambda: aggregate_updates(self.model_updates))
+
     def work(self):
         """
-        Return work contributed by this block.
-        With fixed difficulty, each block counts as 1 unit of work.
+        Return work contributed by this block: the expected number of hashes
+        to meet its difficulty prefix (16 per leading hex zero).
+        Blocks without a recorded difficulty count as 1 unit of work.
         """
-        return 1
-
-
-def genesis_block():
-    return Block(miner_id=-1, model_updates=[], previous_hash="0", nonce=0, timestamp=time.time())
+        if self.difficulty is None:
+            return 1
+        return 16 ** len(self.difficulty)
+
+
+# placeholder serialized in place of the nonce to split the header around it
+_NONCE_MARK = "\x00nonce\x00"
+
+
+class NonceHasher:
+    """
+    Fast PoW hashing for a fixed header where only the nonce changes.
+
+    The header is serialized once exactly like Block.compute_hash and split
+    around the nonce. The bytes before the nonce are fed to sha256 once and
+    that midstate is copied for every attempt, so each hash only processes
+    the nonce digits and the constant suffix.
+    """
+    def __init__(self, header):
+        header = dict(header, nonce=_NONCE_MARK)
+        mark = json.dumps(_NONCE_MARK)
+        prefix, suffix = json.dumps(header, sort_keys=True).split(mark)
+        self._midstate = hashlib.sha256(prefix.encode())
+        self._suffix = suffix.encode()
+
+    def hash(self, nonce):
+        h = self._midstate.copy()
+        h.update(str(nonce).encode())
+        h.update(self._suffix)
+        return h.hexdigest()
+
+
+def genesis_block(model_updates=None):
+    """Unmined first block. `model_updates` (e.g. the initial model for delta training) is committed to its hash."""
+    g = Block(miner_id=-1, model_updates=model_updates or [], previous_hash="0", nonce=0, timestamp=time.time())
+    if model_updates:
+        g.compute_merkle_root()
+    # genesis is not mined, but it needs a real hash to be indexed and linked to
+    g.hash = g.compute_hash()
+    return g
@@ -0,0 +1,172 @@
+# block_store.py
+# Append-only on-disk block log with an offset index
+import io
+import json
+import mmap
+import os
+import struct
+import torch
+from block import Block
+from tensor_store import StoredUpdate, StoredSparseUpdate
+from update_store import FlatUpdate, SparseUpdate
+
+# record: u32 header length, header JSON, u64 payload length, payload (torch.save of model_updates)
+HEADER_LEN = struct.Struct("<I")
+PAYLOAD_LEN = struct.Struct("<Q")
+# index entry: raw block hash, record offset, header length, payload length
+INDEX_ENTRY = struct.Struct("<32sQIQ")
+# the only classes a payload may construct: it is unpickled with weights_only=True,
+# so reading (or validating) an untrusted log cannot run code from it
+PAYLOAD_GLOBALS = [FlatUpdate, SparseUpdate, StoredUpdate, StoredSparseUpdate]
+
+
+class BlockLog:
+    """
+    Append-only block log (`chain.log`) plus a fixed-width offset index (`chain.idx`).
+
+    Appending writes one record, so persisting a block costs O(block), not
+    O(chain). Writes are fsync'ed every `fsync_every` blocks and on close().
+    Reads go through an mmap of the log, so headers can be scanned without
+    loading any payload.
+
+    With readonly=True nothing is written: a torn tail is skipped instead of
+    truncated, and records missing from the index are only indexed in memory.
+    """
+    def __init__(self, directory, fsync_every=8, fresh=False, readonly=False):
+        self.log_path = os.path.join(directory, "chain.log")
+        self.index_path = os.path.join(directory, "chain.idx")
+        self.readonly = readonly
+        if readonly:
+            mode = "rb"
+        else:
+            os.makedirs(directory, exist_ok=True)
+            mode = "w+b" if fresh else "a+b"
+        self.log = open(self.log_path, mode)
+        self.idx = open(self.index_path, mode)
+        self.fsync_every = fsync_every
+        self.unsynced = 0
+        self._mmap = None
+        # block hash -> (offset, header_len, payload_len), in log order
+        self.offsets = {}
+        self._load_index()
+
+    def _load_index(self):
+        self.idx.seek(0)
+        data = self.idx.read()
+        self.log.seek(0, os.SEEK_END)
+        size = self.log.tell()
+        whole = len(data) - len(data) % INDEX_ENTRY.size
+        end = 0
+        for pos in range(0, whole, INDEX_ENTRY.size):
+            raw_hash, offset, hlen, plen = INDEX_ENTRY.unpack_from(data, pos)
+            record_end = offset + HEADER_LEN.size + hlen + PAYLOAD_LEN.size + plen
+            if record_end > size:
+                # the index reached disk but its record did not; this and later entries point past the log
+                whole = pos
+                break
+            self.offsets[raw_hash.hex()] = (offset, hlen, plen)
+            end = max(end, record_end)
+        # drop torn or dangling index entries and re-index any records the index missed before a crash
+        if not self.readonly:
+            self.idx.truncate(whole)
+        self._reindex_from(end)
+
+    def _reindex_from(self, offset):
+        self.log.seek(0, os.SEEK_END)
+        size = self.log.tell()
+        while offset + HEADER_LEN.size <= size:
+            self.log.seek(offset)
+            (hlen,) = HEADER_LEN.unpack(self.log.read(HEADER_LEN.size))
+            header = self.log.read(hlen)
+            plen_bytes = self.log.read(PAYLOAD_LEN.size)
+            if len(header) < hlen or len(plen_bytes) < PAYLOAD_LEN.size:
+                break
+            (plen,) = PAYLOAD_LEN.unpack(plen_bytes)
+            if offset + HEADER_LEN.size + hlen + PAYLOAD_LEN.size + plen > size:
+                break
+            block_hash = json.loads(header)["hash"]
+            self._index(block_hash, offset, hlen, plen)
+            offset += HEADER_LEN.size + hlen + PAYLOAD_LEN.size + plen
+        # anything past the last complete record is a torn write
+        if not self.readonly and offset < size:
+            self.log.truncate(offset)
+
+    def _index(self, block_hash, offset, hlen, plen):
+        self.offsets[block_hash] = (offset, hlen, plen)
+        if self.readonly:
+            return
+        self.idx.seek(0, os.SEEK_END)
+        self.idx.write(INDEX_ENTRY.pack(bytes.fromhex(block_hash), offset, hlen, plen))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, block_hash):
+        return block_hash in self.offsets
+
+    def append(self, block):
+        """Persist one block (header and payload). Already-stored blocks are skipped."""
+        if block.hash in self.offsets:
+            return
+        header = json.dumps(block.header_record()).encode()
+        buf = io.BytesIO()
+        torch.save(block.model_updates, buf)
+        payload = buf.getvalue()
+
+        self.log.seek(0, os.SEEK_END)
+        offset = self.log.tell()
+        self.log.write(HEADER_LEN.pack(len(header)))
+        self.log.write(header)
+        self.log.write(PAYLOAD_LEN.pack(len(payload)))
+        self.log.write(payload)
+        self._index(block.hash, offset, len(header), len(payload))
+
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self.readonly:
+            return
+        for f in (self.log, self.idx):
+            f.flush()
+            os.fsync(f.fileno())
+        self.unsynced = 0
+
+    def _view(self):
+        """mmap of the log, remapped when the file has grown since the last read."""
+        self.log.flush()
+        size = os.fstat(self.log.fileno()).st_size
+        if self._mmap is None or len(self._mmap) < size:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self.log.fileno(), size, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read_header(self, block_hash):
+        offset, hlen, _ = self.offsets[block_hash]
+        start = offset + HEADER_LEN.size
+        return json.loads(self._view()[start:start + hlen])
+
+    def read_payload(self, block_hash):
+        offset, hlen, plen = self.offsets[block_hash]
+        start = offset + HEADER_LEN.size + hlen + PAYLOAD_LEN.size
+        with torch.serialization.safe_globals(PAYLOAD_GLOBALS):
+            return torch.load(io.BytesIO(self._view()[start:start + plen]), weights_only=True)
+
+    def load_block(self, block_hash):
+        """Rebuild a header-only Block whose model_updates are read from the log on access."""
+        block = Block.from_record(self.read_header(block_hash))
+        block.release_payload(lambda: self.read_payload(block_hash))
+        return block
+
+    def hashes(self):
+        """Stored block hashes in append order."""
+        return list(self.offsets)
+
+    def close(self):
+        self.sync()
+        if self._mmap is not None:
+            self._mmap.close()
+        self.log.close()
+        self.idx.close()
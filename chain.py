@@ -1,7 +1,7 @@
 import hashlib
 import json
 import time
-from typing import Dict, List
+from typing import Dict, List, Set
 
 class Block:
     def __init__(self, index, previous_hash, timestamp, data, miner_id, nonce=0, difficulty=4):
@@ -40,81 +40,269 @@ class Block:
         return 1
 
 
+class BlockNode:
+    """A block in the block tree, with a parent pointer and totals up to it."""
+    __slots__ = ("block", "parent", "height", "cumulative_work", "num_children")
+
+    def __init__(self, block, parent, height, cumulative_work):
+        self.block = block
+        self.parent = parent
+        self.height = height
+        self.cumulative_work = cumulative_work
+        self.num_children = 0
+
+
+class Reorg:
+    """
+    Difference between two tips: the common ancestor, the blocks leaving the
+    canonical chain (old tip first) and the blocks joining it (ancestor side first).
+    """
+    def __init__(self, ancestor: Block, disconnected: List[Block], connected: List[Block]):
+        self.ancestor = ancestor
+        self.disconnected = disconnected
+        self.connected = connected
+
+    @property
+    def depth(self):
+        return len(self.disconnected)
+
+
+class OrphanPool:
+    """
+    Blocks whose parent is not known yet, indexed by the missing parent hash.
+
+    Bounded by count and age: the oldest orphans are evicted first, so a
+    flood of unattachable blocks cannot grow memory without limit.
+    """
+    def __init__(self, max_size=100, max_age=600.0):
+        self.max_size = max_size
+        self.max_age = max_age
+        # hash -> (block, arrival time); dict order is arrival order
+        self.blocks: Dict[str, tuple] = {}
+        # missing parent hash -> hashes of orphans waiting on it
+        self.by_parent: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, block_hash):
+        return block_hash in self.blocks
+
+    def add(self, block: Block):
+        if block.hash in self.blocks:
+            return
+        self.expire()
+        while len(self.blocks) >= self.max_size:
+            oldest = next(iter(self.blocks))
+            print(f"[CHAIN] Orphan pool full, evicting {oldest[:8]}")
+            self.remove(oldest)
+        self.blocks[block.hash] = (block, time.time())
+        self.by_parent.setdefault(block.previous_hash, set()).add(block.hash)
+
+    def remove(self, block_hash):
+        block, _ = self.blocks.pop(block_hash)
+        waiting = self.by_parent.get(block.previous_hash)
+        if waiting is not None:
+            waiting.discard(block_hash)
+            if not waiting:
+                del self.by_parent[block.previous_hash]
+        return block
+
+    def expire(self):
+        """Drop orphans older than max_age. Oldest entries are first, so this stops early."""
+        cutoff = time.time() - self.max_age
+        while self.blocks:
+            oldest, (_, arrived) = next(iter(self.blocks.items()))
+            if arrived >= cutoff:
+                break
+            print(f"[CHAIN] Orphan {oldest[:8]} expired")
+            self.remove(oldest)
+
+    def pop_children(self, parent_hash) -> List[Block]:
+        """Remove and return every orphan waiting on parent_hash."""
+        return [self.remove(h) for h in list(self.by_parent.get(parent_hash, ()))]
+
+
 class Blockchain:
-    def __init__(self, genesis_block: Block, difficulty=4):
+    def __init__(self, genesis_block: Block, difficulty=4, max_orphans=100, orphan_max_age=600.0):
         self.difficulty = difficulty
-        # tip_hash -> branch (list of blocks)
-        self.branches: Dict[str, List[Block]] = {genesis_block.hash: [genesis_block]}
-        # canonical chain (best branch)
-        self.chain: List[Block] = [genesis_block]
-        # orphan blocks that didn’t fit yet
-        self.orphans: Dict[str, Block] = {}
+        root = BlockNode(genesis_block, None, 1, genesis_block.work())
+        # block hash -> node, for every block attached to the tree
+        self.index: Dict[str, BlockNode] = {genesis_block.hash: root}
+        # tip_hash -> node for every leaf of the tree
+        self.tips: Dict[str, BlockNode] = {genesis_block.hash: root}
+        # tip of the canonical chain (best branch)
+        self.best_tip: BlockNode = root
+        self._chain_cache = (None, [])
+        # orphan blocks that didn’t fit yet, reconnected when their parent arrives
+        self.orphans = OrphanPool(max_orphans, orphan_max_age)
+        # callables taking a Reorg, run whenever the best tip changes
+        self.reorg_listeners = []
+        # callables taking a Block, run for every block attached to the tree
+        self.block_listeners = []
+        # canonical blocks at or below this height have had their payloads offloaded
+        self.finalized_height = 0
 
     def add_block(self, block: Block):
         """
-        Add a block. If it extends an existing tip, create or extend a branch.
-        Otherwise, store as orphan.
+        Add a block. If its parent is known, attach it to the block tree
+        along with any orphans that were waiting on it. Otherwise, store as orphan.
         """
-        parent_hash = block.previous_hash
-        extended = False
-
-        # Try to attach to one of the known branches
-        for tip_hash, branch in list(self.branches.items()):
-            if branch[-1].hash == parent_hash:
-                # create a new branch based on this one
-                new_branch = list(branch)
-                new_branch.append(block)
-
-                # remove old tip and add new tip
-                if tip_hash in self.branches:
-                    del self.branches[tip_hash]
-                self.branches[block.hash] = new_branch
-
-                print(f"[CHAIN] Added block {block.hash[:8]} (Miner {block.miner_id}) height={len(new_branch)}")
-                extended = True
-                break
+        if block.hash in self.index or block.hash in self.orphans:
+            print(f"[CHAIN] Duplicate block {block.hash[:8]} ignored")
+            return False
+        if block.hash is None or block.compute_hash() != block.hash:
+            # the hash is only evidence of work if it is the hash of this header
+            print(f"[CHAIN] Rejected block {str(block.hash)[:8]} (hash does not match header)")
+            return False
+        minimum = self.min_difficulty()
+        if block.difficulty is not None and not block.difficulty.startswith(minimum):
+            print(f"[CHAIN] Rejected block {block.hash[:8]} (difficulty {block.difficulty} is below {minimum})")
+            return False
+        # work is credited by declared difficulty, so the claim has to hold; blocks
+        # that declare none still have to meet the chain's own difficulty
+        prefix = block.difficulty if block.difficulty is not None else minimum
+        if not block.hash.startswith(prefix):
+            print(f"[CHAIN] Rejected block {block.hash[:8]} (does not meet difficulty {prefix})")
+            return False
 
-        if not extended:
+        parent = self.index.get(block.previous_hash)
+        if parent is None:
             # parent not found -> orphan
             if block.previous_hash:
                 print(f"[CHAIN] Orphan block {block.hash[:8]} (parent {block.previous_hash[:8]} not found yet)")
             else:
                 print(f"[CHAIN] Orphan block {block.hash[:8]} (no parent hash provided)")
-            self.orphans[block.hash] = block
+            self.orphans.add(block)
             return False
 
-        # after adding, try to resolve conflicts
-        self.resolve_conflicts()
+        previous_best = self.best_tip
+        self._attach(block, parent)
+        # cascade: each attached block may be the missing parent of waiting orphans
+        pending = [block.hash]
+        while pending:
+            parent = self.index[pending.pop()]
+            for child in self.orphans.pop_children(parent.block.hash):
+                print(f"[CHAIN] Reconnecting orphan {child.hash[:8]}")
+                self._attach(child, parent)
+                pending.append(child.hash)
+
+        if self.best_tip is not previous_best:
+            print(f"[CHAIN] Fork resolved. Canonical length={self.best_tip.height}")
+            self._notify_reorg(previous_best)
         return True
 
-    def resolve_conflicts(self):
-        """
-        Resolve forks by selecting the branch with the most cumulative work.
+    def min_difficulty(self) -> str:
+        """Hash prefix every block must meet; `difficulty` may be a prefix or a count of leading zeros."""
+        return self.difficulty if isinstance(self.difficulty, str) else "0" * self.difficulty
+
+    def _attach(self, block: Block, parent: BlockNode):
+        node = BlockNode(block, parent, parent.height + 1, parent.cumulative_work + block.work())
+        self.index[block.hash] = node
+        parent.num_children += 1
+        # the parent stops being a tip once extended; interior parents start a new fork
+        self.tips.pop(parent.block.hash, None)
+        self.tips[block.hash] = node
+        # fork choice is a single comparison against the current best tip
+        if node.cumulative_work > self.best_tip.cumulative_work:
+            self.best_tip = node
+        print(f"[CHAIN] Added block {block.hash[:8]} (Miner {block.miner_id}) height={node.height}")
+        for listener in self.block_listeners:
+            listener(block)
+
+    def prune(self, finality_depth: int, offload=None):
         """
-        best_branch = self.chain
-        best_work = self.calculate_cumulative_work(best_branch)
+        Bound the block tree's memory.
 
-        for branch in self.branches.values():
-            branch_work = self.calculate_cumulative_work(branch)
-            if branch_work > best_work:
-                best_branch = branch
-                best_work = branch_work
-
-        if best_branch != self.chain:
-            self.chain = best_branch
-            print(f"[CHAIN] Fork resolved. Canonical length={len(self.chain)}")
-
-    def calculate_cumulative_work(self, branch: List[Block]) -> int:
+        Fork tips more than finality_depth blocks behind the best tip are
+        dropped together with every block only they reached. Canonical blocks
+        that deep are final; if `offload` is given it is called once with each
+        of them to move its model updates out of memory.
+        """
+        cutoff = self.best_tip.height - finality_depth
+        if cutoff <= 0:
+            return
+
+        for tip_hash, node in list(self.tips.items()):
+            if node.height >= cutoff or node is self.best_tip:
+                continue
+            del self.tips[tip_hash]
+            # remove the stale branch back to where it forks off a block that is still needed
+            while node is not None and node.num_children == 0 and node is not self.best_tip:
+                del self.index[node.block.hash]
+                parent = node.parent
+                if parent is not None:
+                    parent.num_children -= 1
+                node = parent
+            print(f"[CHAIN] Pruned stale fork {tip_hash[:8]} (more than {finality_depth} blocks behind)")
+
+        if offload is None:
+            return
+        node = self.best_tip
+        while node is not None and node.height > cutoff:
+            node = node.parent
+        # genesis carries no payload
+        while node is not None and node.height > self.finalized_height and node.parent is not None:
+            offload(node.block)
+            node = node.parent
+        self.finalized_height = max(self.finalized_height, cutoff)
+
+    def find_fork(self, old_tip_hash: str, new_tip_hash: str) -> Reorg:
         """
-        Calculate total work for a branch. If difficulty varies, sum actual work.
+        Walk both tips back to their common ancestor using heights.
+        Costs O(fork depth), not O(chain length).
         """
-        return sum(b.work() for b in branch)
+        old = self.index[old_tip_hash]
+        new = self.index[new_tip_hash]
+        disconnected, connected = [], []
+        while old.height > new.height:
+            disconnected.append(old.block)
+            old = old.parent
+        while new.height > old.height:
+            connected.append(new.block)
+            new = new.parent
+        while old is not new:
+            disconnected.append(old.block)
+            connected.append(new.block)
+            old, new = old.parent, new.parent
+        connected.reverse()
+        return Reorg(old.block, disconnected, connected)
+
+    def _notify_reorg(self, previous_best: BlockNode):
+        if not self.reorg_listeners:
+            return
+        reorg = self.find_fork(previous_best.block.hash, self.best_tip.block.hash)
+        for listener in self.reorg_listeners:
+            listener(reorg)
+
+    def branch(self, tip_hash: str) -> List[Block]:
+        """Blocks from genesis to tip_hash, by walking parent pointers."""
+        blocks = []
+        node = self.index[tip_hash]
+        while node is not None:
+            blocks.append(node.block)
+            node = node.parent
+        blocks.reverse()
+        return blocks
+
+    @property
+    def chain(self) -> List[Block]:
+        """Canonical chain (best branch), rebuilt only when the best tip changes."""
+        tip_hash = self.best_tip.block.hash
+        if self._chain_cache[0] != tip_hash:
+            self._chain_cache = (tip_hash, self.branch(tip_hash))
+        return self._chain_cache[1]
+
+    @property
+    def branches(self) -> Dict[str, List[Block]]:
+        """tip_hash -> branch (list of blocks), materialized on demand."""
+        return {tip_hash: self.branch(tip_hash) for tip_hash in self.tips}
 
     def get_last_block(self) -> Block:
-        return self.chain[-1]
+        return self.best_tip.block
 
     def get_height(self) -> int:
-        return len(self.chain)
+        return self.best_tip.height
 
 
 
@@ -1,6 +1,7 @@
 import copy
 import time
-from model import initialize_model, aggregate_updates
+from model import initialize_model
+from update_store import share_update, flatten_update, top_k
 
 class Client:
     def __init__(self, client_id, train_loader, config):
@@ -8,8 +9,11 @@ class Client:
         self.train_loader = train_loader
         self.config = config
         self.local_model = initialize_model()
+        # error-feedback memory for top-k deltas: dtype -> entries not sent yet
+        self.residual = {}
 
     def train(self):
+        base = self.snapshot()
         optimizer = self.config.optimizer(self.local_model.parameters(), lr=self.config.lr, momentum=self.config.momentum)
         self.local_model.train()
 
@@ -24,9 +28,33 @@ class Client:
         end = time.time()
 
         print(f"[Client {self.id}] Trained locally in {round(end - start, 2)}s")
-        return self.local_model.state_dict(), round(end - start, 2), len(self.train_loader.dataset)
+        return self.make_update(base), round(end - start, 2), len(self.train_loader.dataset)
 
-    def update_global_model(self, block):
+    def snapshot(self):
+        """Copy of the starting model that make_update diffs against; None when full models are sent."""
+        if self.config.update_mode != "delta":
+            return None
+        return flatten_update(self.local_model.state_dict())
+
+    def make_update(self, base=None):
+        """
+        What the client uploads after training: a shared-memory copy of the model,
+        or with a `base` snapshot its delta (local - base), top-k sparsified when
+        training.topk_ratio < 1.
+        """
+        state = self.local_model.state_dict()
+        if base is None:
+            # hand out a shared-memory snapshot, not the live parameters this client keeps training
+            return share_update(state)
+        delta = {name: state[name] - base[name] for name in base}
+        if self.config.topk_ratio >= 1:
+            return share_update(delta)
+        # top_k copies the kept entries into shared memory itself
+        return top_k(flatten_update(delta), self.config.topk_ratio,
+                     self.residual if self.config.error_feedback else None)
+
+    def update_global_model(self, block, state=None):
+        """Load the global model at `block`; pass `state` when it is not the block's own aggregate."""
         print(f"[Client {self.id}] Updating global model using block from Miner {block.miner_id}")
-        self.local_model.load_state_dict(aggregate_updates(block.model_updates))
+        self.local_model.load_state_dict(block.aggregate() if state is None else state)
 
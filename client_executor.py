@@ -0,0 +1,180 @@
+# client_executor.py
+# Backends that run Client.train for a whole round: sequentially, on a process pool, or in vmapped cohorts
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import torch
+import torch.nn.functional as F
+from torch.func import functional_call, grad, vmap
+
+# per-worker state, filled in by _init_worker
+_clients = {}
+
+
+def _init_worker(clients, threads_per_worker, counter):
+    global _clients
+    _clients = {c.id: c for c in clients}
+    torch.set_num_threads(threads_per_worker)
+
+    # pin each worker to its own block of cores so intra-op threads do not migrate
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    if hasattr(os, "sched_setaffinity"):
+        # only cores this process may run on (a container's cpuset can be narrower than cpu_count)
+        allowed = sorted(os.sched_getaffinity(0))
+        if len(allowed) >= threads_per_worker:
+            cores = {allowed[(slot * threads_per_worker + i) % len(allowed)] for i in range(threads_per_worker)}
+            os.sched_setaffinity(0, cores)
+
+
+def _train(client_id, global_state, residual):
+    client = _clients[client_id]
+    # the worker's copy of the client is stale after round 1; start from the parent's global model
+    if global_state is not None:
+        client.local_model.load_state_dict(global_state)
+    # any worker may train this client next round, so error feedback lives in the parent
+    client.residual = residual
+    update, comp_time, sample_count = client.train()
+    return client_id, update, comp_time, sample_count, client.residual
+
+
+def _train_cohort(client_ids, global_state, residuals):
+    clients = [_clients[cid] for cid in client_ids]
+    for client, residual in zip(clients, residuals):
+        if global_state is not None:
+            client.local_model.load_state_dict(global_state)
+        client.residual = residual
+    return [(client.id,) + result + (client.residual,) for client, result in zip(clients, train_cohort(clients))]
+
+
+def _padded_batch(batch, batch_size):
+    """Pad a (data, target) batch to batch_size; the returned weights are 1 for real samples."""
+    data, target = batch
+    n = len(target)
+    weight = torch.zeros(batch_size)
+    weight[:n] = 1
+    if n < batch_size:
+        data = torch.cat([data, data.new_zeros((batch_size - n,) + data.shape[1:])])
+        target = torch.cat([target, target.new_zeros(batch_size - n)])
+    return data, target, weight
+
+
+def train_cohort(clients):
+    """
+    Train several clients as one batched computation. Their models' parameters
+    are stacked along a new leading dimension, and forward/backward for all of
+    them runs through vmap(grad(functional_call)) on one stacked batch per step.
+    This is the same SGD with momentum and mean cross-entropy that Client.train
+    runs, but the per-op work is large enough to keep BLAS busy.
+
+    Clients with shorter loaders are padded: samples beyond a batch's end get
+    zero loss weight, and a client with no batch left is frozen for the step
+    (momentum included). Returns (update, comp_time, sample_count) per client;
+    comp_time is the cohort's wall time, since the clients train simultaneously.
+    """
+    config = clients[0].config
+    model = clients[0].local_model
+    bases = [c.snapshot() for c in clients]
+    batch_size = max(loader.batch_size for loader in (c.train_loader for c in clients))
+    params = {name: torch.stack([dict(c.local_model.named_parameters())[name].detach() for c in clients])
+              for name, _ in model.named_parameters()}
+    velocity = {name: torch.zeros_like(p) for name, p in params.items()}
+
+    def loss(p, data, target, weight):
+        out = functional_call(model, p, (data,))
+        return (F.cross_entropy(out, target, reduction="none") * weight).sum() / weight.sum().clamp(min=1)
+
+    cohort_grad = vmap(grad(loss))
+
+    start = time.time()
+    for _ in range(config.local_epochs):
+        loaders = [iter(c.train_loader) for c in clients]
+        while True:
+            batches = [next(it, None) for it in loaders]
+            active = torch.tensor([b is not None for b in batches], dtype=torch.float32)
+            if not active.any():
+                break
+            # finished clients get an all-padding batch
+            data, target = next(b for b in batches if b is not None)
+            empty = (data[:0], target[:0])
+            data, target, weight = (torch.stack(t) for t in zip(*(
+                _padded_batch(b if b is not None else empty, batch_size) for b in batches)))
+            weight *= active[:, None]
+
+            grads = cohort_grad(params, data, target, weight)
+            for name, g in grads.items():
+                mask = active.view((-1,) + (1,) * (g.dim() - 1))
+                # torch.optim.SGD: buf = momentum * buf + grad; p -= lr * buf
+                velocity[name] = torch.where(mask.bool(), config.momentum * velocity[name] + g, velocity[name])
+                params[name] = params[name] - config.lr * velocity[name] * mask
+    elapsed = round(time.time() - start, 2)
+
+    print(f"[Cohort] Trained clients {[c.id for c in clients]} together in {elapsed}s")
+    results = []
+    for i, client in enumerate(clients):
+        with torch.no_grad():
+            for name, p in client.local_model.named_parameters():
+                p.copy_(params[name][i])
+        results.append((client.make_update(bases[i]), elapsed, len(client.train_loader.dataset)))
+    return results
+
+
+class ClientExecutor:
+    def __init__(self, clients, num_workers=1, threads_per_worker=1, cohort_size=1):
+        """
+        num_workers <= 1 trains clients one after another in this process.
+        Otherwise a pool of forked workers is created once; each worker holds
+        its own copy of every client (data loaders included) and only the
+        global model goes out and the update comes back per task.
+        cohort_size > 1 trains that many clients at a time with train_cohort,
+        in this process or as one task per cohort on the pool.
+        """
+        self.clients = {c.id: c for c in clients}
+        self.num_workers = num_workers
+        self.cohort_size = max(1, cohort_size)
+        self.pool = None
+        if num_workers > 1:
+            ctx = mp.get_context("fork")
+            self.pool = ProcessPoolExecutor(num_workers, mp_context=ctx, initializer=_init_worker,
+                                            initargs=(clients, threads_per_worker, ctx.Value("i", 0)))
+            # fork every worker now, while this is the only thread: rounds run next to mining threads
+            self.pool.submit(os.getpid).result()
+
+    def cohorts(self):
+        ids = list(self.clients)
+        return [ids[i:i + self.cohort_size] for i in range(0, len(ids), self.cohort_size)]
+
+    def train_round(self, global_state=None):
+        """
+        Train every client once. Yields (client, update, comp_time, sample_count)
+        as soon as each client (or cohort) finishes, not in client order.
+        `global_state` is the model clients start from (None in the first round);
+        in-process clients already hold it through update_global_model.
+        """
+        if self.pool is None:
+            if self.cohort_size == 1:
+                for client in self.clients.values():
+                    yield (client,) + client.train()
+                return
+            for ids in self.cohorts():
+                clients = [self.clients[cid] for cid in ids]
+                for client, result in zip(clients, train_cohort(clients)):
+                    yield (client,) + result
+            return
+
+        if self.cohort_size == 1:
+            futures = [self.pool.submit(_train, cid, global_state, self.clients[cid].residual) for cid in self.clients]
+            results = (future.result() for future in as_completed(futures))
+        else:
+            futures = [self.pool.submit(_train_cohort, ids, global_state, [self.clients[cid].residual for cid in ids])
+                       for ids in self.cohorts()]
+            results = (result for future in as_completed(futures) for result in future.result())
+        for client_id, update, comp_time, sample_count, residual in results:
+            self.clients[client_id].residual = residual
+            yield self.clients[client_id], update, comp_time, sample_count
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -11,11 +11,19 @@ class Config:
         self.num_clients = cfg['system']['num_clients']
         self.num_miners = cfg['system']['num_miners']
         self.epochs = cfg['system']['epochs']
+        self.client_workers = cfg['system']['client_workers']
+        self.threads_per_worker = cfg['system']['threads_per_worker']
+        self.cohort_size = cfg['system']['cohort_size']
+        self.resume = cfg['system']['resume']
 
         self.local_epochs = cfg['training']['local_epochs']
         self.batch_size = cfg['training']['batch_size']
         self.lr = cfg['training']['lr']
         self.momentum = cfg['training']['momentum']
+        self.aggregate_cache_size = cfg['training']['aggregate_cache_size']
+        self.update_mode = cfg['training']['update_mode']
+        self.topk_ratio = cfg['training']['topk_ratio']
+        self.error_feedback = cfg['training']['error_feedback']
         self.loss_fn = nn.CrossEntropyLoss()
         self.optimizer = optim.SGD
 
@@ -24,3 +32,21 @@ class Config:
         self.delta = cfg['miner']['delta']
         self.nd = cfg['miner']['nd']
         self.T_wait = cfg['miner']['T_wait']
+        self.pow_workers = cfg['miner']['pow_workers']
+        self.competing_blocks = cfg['miner']['competing_blocks']
+
+        self.max_orphans = cfg['chain']['max_orphans']
+        self.orphan_max_age = cfg['chain']['orphan_max_age']
+        self.finality_depth = cfg['chain']['finality_depth']
+        self.store_dir = cfg['chain']['store_dir']
+        self.fsync_every = cfg['chain']['fsync_every']
+        self.tensor_dir = cfg['chain']['tensor_dir']
+
+        self.data_backend = cfg['data']['backend']
+        self.data_root = cfg['data']['root']
+        self.data_mmap = cfg['data']['mmap']
+        self.partition = cfg['data']['partition']
+        self.partition_seed = cfg['data']['partition_seed']
+        self.partition_alpha = cfg['data']['partition_alpha']
+        self.shards_per_client = cfg['data']['shards_per_client']
+        self.partition_dir = cfg['data']['partition_dir']
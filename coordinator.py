@@ -0,0 +1,110 @@
+# coordinator.py
+# Runs PoW rounds on long-lived worker processes and closes a round once enough blocks are in
+import queue
+import threading
+import multiprocessing as mp
+from pow_engine import search_nonce, RESULT_TIMEOUT
+
+
+def pow_worker(tasks, results, stop_event):
+    """
+    Worker loop: receive (miner_id, header, difficulty, pow_workers) tasks and
+    return (miner_id, PowResult or None). Only headers and results cross the
+    process boundary; model updates stay in the parent.
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        miner_id, header, difficulty, pow_workers = task
+        try:
+            result = search_nonce(header, difficulty, pow_workers, stop_event)
+        except Exception as e:
+            # hand the failure to the parent instead of leaving it waiting on this miner
+            result = e
+        results.put((miner_id, result))
+
+
+class MiningCoordinator:
+    def __init__(self, miners, competing_blocks=1):
+        """
+        One persistent PoW worker per miner, started once and reused every round.
+
+        competing_blocks: how many blocks end a round.
+            1     -> first block wins, all other miners abort immediately
+            k > 1 -> keep the first k competing blocks for fork resolution
+        """
+        self.miners = miners
+        self.competing_blocks = max(1, min(competing_blocks, len(miners)))
+        self.stop_event = mp.Event()
+        self.results = mp.Queue()
+        self.tasks = {}
+        self.workers = []
+        for miner in miners:
+            tasks = mp.Queue()
+            # not daemonic so a worker may fan out into pow_workers processes of its own
+            p = mp.Process(target=pow_worker, args=(tasks, self.results, self.stop_event))
+            p.start()
+            self.tasks[miner.id] = tasks
+            self.workers.append(p)
+
+    def mine_round(self, prev_hash):
+        """
+        Mine on top of prev_hash with every miner. Returns blocks in arrival order.
+        Miners collect until their quota is met or their intake is closed
+        (Miner.close_intake), so uploads may still be in flight when this is called.
+        """
+        self.stop_event.clear()
+        by_id = {miner.id: miner for miner in self.miners}
+        pending = {}
+        lock = threading.Lock()
+
+        # miners wait side by side while the round's uploads are delivered, so each one
+        # starts hashing the moment its own quota is met, and the rest once the intake closes
+        def collect(miner):
+            if not miner.wait_for_updates(stop_event=self.stop_event):
+                return
+            block = miner.prepare_block(prev_hash)
+            with lock:
+                pending[miner.id] = block
+            self.tasks[miner.id].put((miner.id, block.header(), miner.difficulty, miner.pow_workers))
+
+        collectors = [threading.Thread(target=collect, args=(miner,), daemon=True) for miner in self.miners]
+        for t in collectors:
+            t.start()
+
+        blocks = []
+        finished = set()
+        while any(t.is_alive() for t in collectors) or len(finished) < len(pending):
+            try:
+                miner_id, result = self.results.get(timeout=RESULT_TIMEOUT)
+            except queue.Empty:
+                self._check_workers(set(pending) - finished)
+                continue
+            finished.add(miner_id)
+            if isinstance(result, Exception):
+                raise RuntimeError(f"PoW for miner {miner_id} failed") from result
+            block = by_id[miner_id].finalize_block(pending[miner_id], result)
+            # every result is drained so none leaks into the next round, but a block
+            # found before the stop flag reached its worker is still too late
+            if block is None or len(blocks) == self.competing_blocks:
+                continue
+            blocks.append(block)
+            if len(blocks) == self.competing_blocks:
+                # shared flag: losing miners stop at their next check, collecting ones stop waiting
+                self.stop_event.set()
+        return blocks
+
+    def _check_workers(self, outstanding):
+        """Raise if a worker that still owes this round a result has exited."""
+        for miner, p in zip(self.miners, self.workers):
+            if miner.id in outstanding and p.exitcode is not None:
+                raise RuntimeError(f"PoW worker for miner {miner.id} died with exit code {p.exitcode}")
+
+    def close(self):
+        # abort any search still running (e.g. when closing after an error) so the joins return
+        self.stop_event.set()
+        for tasks in self.tasks.values():
+            tasks.put(None)
+        for p in self.workers:
+            p.join()
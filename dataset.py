@@ -1,22 +1,181 @@
 # dataset.py
+import gzip
+import os
+import shutil
+import numpy as np
 import torch
 from torchvision import datasets, transforms
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import DataLoader, Dataset, Subset
+from partition import partition
+
+IDX_UBYTE = 0x08
+
+
+def read_idx(path, mmap=False):
+    """
+    Decode a uint8 IDX file (as MNIST ships) into one tensor.
+    With mmap=True the file is mapped copy-on-write instead of read: pages are
+    loaded on first touch and every process mapping the file shares them
+    through the page cache. .gz files are always read.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        magic = f.read(4)
+        if magic[2] != IDX_UBYTE:
+            raise ValueError(f"{path}: only uint8 IDX files are supported")
+        shape = [int.from_bytes(f.read(4), "big") for _ in range(magic[3])]
+        if mmap and opener is open:
+            return torch.from_numpy(np.memmap(path, dtype=np.uint8, mode="c", offset=4 + 4 * len(shape),
+                                              shape=tuple(shape)))
+        numel = 1
+        for d in shape:
+            numel *= d
+        data = torch.frombuffer(bytearray(f.read(numel)), dtype=torch.uint8)
+    return data.view(shape)
+
+
+def _decompress(path):
+    """Write the uncompressed copy of a .gz raw file next to it (once) so it can be mapped."""
+    target = path[:-len(".gz")]
+    if not os.path.exists(target):
+        tmp = f"{target}.tmp{os.getpid()}"
+        with gzip.open(path, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, target)
+    return target
+
+
+def _raw_file(raw_dir, name):
+    """Path of an MNIST raw file, preferring the uncompressed copy."""
+    for path in (os.path.join(raw_dir, name), os.path.join(raw_dir, name + ".gz")):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_mnist_tensors(root='./data', train=True, mmap=False):
+    """
+    Return (images, labels) as uint8 tensors of shape (N, 28, 28) and (N,),
+    decoded once from the IDX files in <root>/MNIST/raw. Missing files are
+    downloaded through torchvision first. With mmap=True both are mapped from
+    uncompressed files (decompressed on first use), and repeated calls in one
+    process return the same mapping.
+    """
+    key = (os.path.abspath(root), train)
+    if mmap and key in _mapped:
+        return _mapped[key]
+    raw_dir = os.path.join(root, "MNIST", "raw")
+    prefix = "train" if train else "t10k"
+    names = (f"{prefix}-images-idx3-ubyte", f"{prefix}-labels-idx1-ubyte")
+    if any(_raw_file(raw_dir, name) is None for name in names):
+        datasets.MNIST(root=root, train=train, download=True)
+    paths = [_raw_file(raw_dir, name) for name in names]
+    if mmap:
+        paths = [_decompress(p) if p.endswith(".gz") else p for p in paths]
+    images, labels = (read_idx(p, mmap) for p in paths)
+    if mmap:
+        _mapped[key] = images, labels
+    return images, labels
+
+
+# (root, train) -> mapped (images, labels), so every shard in a process shares one mapping
+_mapped = {}
+
+
+def _open_shard(root, train, indices):
+    images, labels = load_mnist_tensors(root, train, mmap=True)
+    return ShardDataset(images, labels, indices, source=(root, train))
+
+
+class ShardDataset(Dataset):
+    """
+    One client's shard: an index view into the shared image and label tensors.
+    A shard over mapped MNIST (`source` = (root, train)) pickles as just its
+    indices; the receiving process maps the same files instead of copying data.
+    """
+    def __init__(self, images, labels, indices, source=None):
+        self.images = images
+        self.labels = labels
+        self.indices = torch.as_tensor(indices, dtype=torch.long)
+        self.source = source
+
+    def __reduce__(self):
+        if self.source is None:
+            return ShardDataset, (self.images, self.labels, self.indices)
+        return _open_shard, self.source + (self.indices,)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        j = self.indices[i]
+        return self.images[j].unsqueeze(0).float().div_(255), self.labels[j].long()
+
+    def batch(self, positions):
+        """Images and labels at shard positions `positions`, gathered in one slice."""
+        idx = self.indices[positions]
+        return self.images[idx].unsqueeze(1).float().div_(255), self.labels[idx].long()
+
+
+class ShardLoader:
+    """
+    Drop-in for a DataLoader over a ShardDataset: every batch is one vectorized
+    gather and uint8 -> float conversion instead of per-sample decoding and collation.
+    """
+    def __init__(self, dataset, batch_size, shuffle=False):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        n = len(self.dataset)
+        order = torch.randperm(n) if self.shuffle else torch.arange(n)
+        for start in range(0, n, self.batch_size):
+            yield self.dataset.batch(order[start:start + self.batch_size])
+
+
+def client_partition(labels, config):
+    """Per-client sample indices under the configured partition scheme (cached in data.partition_dir)."""
+    params = {"dirichlet": {"alpha": config.partition_alpha}, "quantity": {"alpha": config.partition_alpha},
+              "shards": {"shards_per_client": config.shards_per_client}}.get(config.partition, {})
+    return partition(labels, config.num_clients, config.partition, config.partition_seed,
+                     config.partition_dir, **params)
+
 
 def load_datasets(config):
+    if config.data_backend == "torchvision":
+        return load_torchvision_datasets(config)
+
+    images, labels = load_mnist_tensors(config.data_root, train=True, mmap=config.data_mmap)
+    source = (config.data_root, True) if config.data_mmap else None
+    train_loaders = [
+        ShardLoader(ShardDataset(images, labels, indices, source), batch_size=config.batch_size, shuffle=True)
+        for indices in client_partition(labels.numpy(), config)
+    ]
+
+    test_images, test_labels = load_mnist_tensors(config.data_root, train=False, mmap=config.data_mmap)
+    test_loader = ShardLoader(ShardDataset(test_images, test_labels, torch.arange(len(test_labels))),
+                              batch_size=1000, shuffle=False)
+
+    return train_loaders, test_loader
+
+
+def load_torchvision_datasets(config):
     transform = transforms.Compose([transforms.ToTensor()])
-    full_dataset = datasets.MNIST(root='./data', train=True, download=True, transform=transform)
+    full_dataset = datasets.MNIST(root=config.data_root, train=True, download=True, transform=transform)
 
-    # Split dataset equally among clients
-    client_data_size = len(full_dataset) // config.num_clients
-    client_datasets = random_split(full_dataset, [client_data_size] * config.num_clients)
+    client_datasets = [Subset(full_dataset, indices.tolist())
+                       for indices in client_partition(full_dataset.targets.numpy(), config)]
 
     train_loaders = [
         DataLoader(client_dataset, batch_size=config.batch_size, shuffle=True)
         for client_dataset in client_datasets
     ]
 
-    test_dataset = datasets.MNIST(root='./data', train=False, download=True, transform=transform)
+    test_dataset = datasets.MNIST(root=config.data_root, train=False, download=True, transform=transform)
     test_loader = DataLoader(test_dataset, batch_size=1000, shuffle=False)
 
     return train_loaders, test_loader
@@ -5,32 +5,18 @@ from miner import Miner
 from server import Server
 from config import Config
 from dataset import load_datasets
-from model import evaluate
+from model import evaluate, aggregate_cache
+from coordinator import MiningCoordinator
+from client_executor import ClientExecutor
 import random
-from multiprocessing import Process, Queue
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 
-# Worker function to mine block in parallel
-def mine_worker(miner, prev_hash, queue):
-    block = miner.mine_block(prev_hash)
-    queue.put(block)
 
-if __name__ == '__main__':
-    config = Config()
-    train_loaders, test_loader = load_datasets(config)
-
-    clients = [Client(i, train_loaders[i], config) for i in range(config.num_clients)]
-    miners = [Miner(i, config) for i in range(config.num_miners)]
-    server = Server(config)
-
-    test_accuracies = []
-
-    for epoch in range(config.epochs):
-        print(f"\n====================== EPOCH {epoch + 1} ======================")
-
-        # STEP 1-2: Clients train locally and upload to random miners
-        for client in clients:
-            update, comp_time, sample_count = client.train()
+def upload_round(executor, miners, global_state):
+    """Train every client, upload each update to a random miner as it finishes, then cross-verify."""
+    try:
+        for client, update, comp_time, sample_count in executor.train_round(global_state):
             selected_miner = random.choice(miners)
             print(f"[Client {client.id}] ➜ Miner {selected_miner.id} | samples: {sample_count} | time: {comp_time:.2f}s")
             selected_miner.receive_update(client.id, update, comp_time, sample_count)
@@ -38,48 +24,88 @@ if __name__ == '__main__':
         # STEP 3: Miners cross-verify
         for miner in miners:
             miner.cross_verify(miners)
-
-        # STEP 4-5: Parallel PoW mining
-        queue = Queue()
-        processes = []
-        prev_hash = server.get_chain()[-1].hash
-
-        print("\n⛏️  Mining Results:")
+    finally:
+        # nothing more is coming this round; miners short of their quota stop waiting
         for miner in miners:
-            p = Process(target=mine_worker, args=(miner, prev_hash, queue))
-            p.start()
-            processes.append(p)
-
-        blocks = [queue.get() for _ in miners]
-        for p in processes:
-            p.join()
+            miner.close_intake()
 
-        # STEP 5b: Add all mined blocks (fork resolution happens inside)
-        for b in blocks:
-            server.add_block(b)
+if __name__ == '__main__':
+    config = Config()
+    train_loaders, test_loader = load_datasets(config)
 
-        # STEP 6: After fork resolution, update all clients with canonical tip
-        tip = server.get_chain()[-1]
+    clients = [Client(i, train_loaders[i], config) for i in range(config.num_clients)]
+    miners = [Miner(i, config) for i in range(config.num_miners)]
+    server = Server(config)
+    coordinator = MiningCoordinator(miners, config.competing_blocks)
+    aggregate_cache.capacity = config.aggregate_cache_size
+
+    # on resume, every mined block on the canonical chain is a finished epoch
+    start_epoch = server.blockchain.get_height() - 1
+    global_state = server.global_model()
+    if start_epoch > 0:
+        print(f"[✓] Resuming at epoch {start_epoch + 1} from block {server.applied_block.hash[:8]}")
+    if global_state is not None:
         for client in clients:
-            client.update_global_model(tip)
-
-        # Evaluate and print accuracy
-        global_model_state = tip.model_updates[0][1].copy()
-        for key in global_model_state:
-            global_model_state[key] = sum(update[1][key] * update[3] for update in tip.model_updates) / sum(update[3] for update in tip.model_updates)
+            client.update_global_model(server.applied_block, global_state)
+    executor = ClientExecutor(clients, config.client_workers, config.threads_per_worker, config.cohort_size)
 
-        acc = evaluate(global_model_state, test_loader, config)
-        print(f"\n🌳 Canonical Chain Tip: {tip.hash[:8]} | Height: {len(server.get_chain())}")
-        print(f"📈 Global Model Accuracy: {acc:.2f}%")
-
-        test_accuracies.append(acc)
-
-    # Save chain to file
-    server.save_chain_to_file("chain.json")
-    print("\n[✓] BlockFL Training Complete and chain saved to chain.json")
+    test_accuracies = []
+    uploader = ThreadPoolExecutor(1)
+
+    try:
+        for epoch in range(start_epoch, config.epochs):
+            print(f"\n====================== EPOCH {epoch + 1} ======================")
+            if config.update_mode == "delta":
+                # deltas are relative to the current global model, so a block may only carry this
+                # round's; any left over were trained against the model this round replaced
+                for miner in miners:
+                    miner.reset_updates(server.applied_block)
+            for miner in miners:
+                miner.open_intake()
+
+            # STEP 1-3: Clients train and upload to random miners in the background, so miners
+            # already waiting for their quota see each update the moment it arrives
+            uploads = uploader.submit(upload_round, executor, miners, global_state)
+
+            # STEP 4-5: Parallel PoW mining, closed once the round policy is met
+            prev_hash = server.blockchain.get_last_block().hash
+
+            print("\n⛏️  Mining Results:")
+            blocks = coordinator.mine_round(prev_hash)
+            # miners that met their quota early mined without the later uploads; in full mode those
+            # go into the next block, in delta mode they are stale once the new block lands
+            uploads.result()
+
+            # STEP 5b: Add all mined blocks (fork resolution happens inside)
+            for b in blocks:
+                server.add_block(b)
+
+            # STEP 6: After fork resolution, update all clients with canonical tip
+            tip = server.blockchain.get_last_block()
+            global_state = server.global_model()
+            for client in clients:
+                client.update_global_model(tip, global_state)
+
+            # Evaluate and print accuracy
+            acc = evaluate(global_state, test_loader, config)
+            print(f"\n🌳 Canonical Chain Tip: {tip.hash[:8]} | Height: {server.blockchain.get_height()}")
+            print(f"📈 Global Model Accuracy: {acc:.2f}%")
+
+            test_accuracies.append(acc)
+
+        # miners no longer hold updates; drop the files no stored block points to
+        server.collect_tensors()
+    finally:
+        uploader.shutdown()
+        # PoW workers are not daemonic; an error in the loop must still shut them down
+        coordinator.close()
+        executor.close()
+        # Blocks were persisted as they were added; just flush the log
+        server.close()
+    print("\n[✓] BlockFL Training Complete")
 
     # Plot accuracy
-    plt.plot(range(1, config.epochs + 1), test_accuracies, marker='o')
+    plt.plot(range(start_epoch + 1, config.epochs + 1), test_accuracies, marker='o')
     plt.xlabel("Epoch")
     plt.ylabel("Test Accuracy (%)")
     plt.title("Global Model Accuracy per Epoch")
@@ -0,0 +1,77 @@
+# merkle.py
+# Merkle commitments over model updates so block hashes cover the updates they carry
+import hashlib
+import json
+import torch
+
+# domain separation so a leaf can never be passed off as an inner node
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def tensor_digest(state_dict):
+    """
+    sha256 over a state dict: every tensor's name, dtype, shape and raw bytes,
+    in sorted key order. Returns the hex digest.
+    """
+    h = hashlib.sha256()
+    for key in sorted(state_dict.keys()):
+        t = state_dict[key].detach().cpu().contiguous()
+        h.update(json.dumps([key, str(t.dtype), list(t.shape)]).encode())
+        h.update(t.reshape(-1).view(torch.uint8).numpy())
+    return h.hexdigest()
+
+
+def update_digest(update):
+    """Leaf digest for one (client_id, update_dict, comp_time, sample_count) entry."""
+    client_id, state_dict, comp_time, sample_count = update
+    meta = json.dumps([client_id, comp_time, sample_count]).encode()
+    # updates from the tensor store are addressed by this digest already; don't re-read them
+    digest = getattr(state_dict, "digest", None) or tensor_digest(state_dict)
+    return hashlib.sha256(LEAF_PREFIX + meta + bytes.fromhex(digest)).hexdigest()
+
+
+def _parent(left, right):
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+class MerkleTree:
+    """
+    Binary Merkle tree over hex leaf digests.
+    An odd node at the end of a level is promoted unchanged to the next level.
+    """
+    def __init__(self, leaves):
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            nxt = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                nxt.append(level[-1])
+            self.levels.append(nxt)
+
+    @property
+    def root(self):
+        if not self.levels[0]:
+            return hashlib.sha256(b'').hexdigest()
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        """
+        Inclusion proof for leaf `index`: list of (sibling_digest, sibling_is_left)
+        from the leaf level up. Length is O(log n).
+        """
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append((level[sibling], sibling < index))
+            index //= 2
+        return path
+
+
+def verify_proof(leaf, proof, root):
+    """Check that `leaf` is committed under `root` using a proof from MerkleTree.proof."""
+    node = leaf
+    for sibling, sibling_is_left in proof:
+        node = _parent(sibling, node) if sibling_is_left else _parent(node, sibling)
+    return node == root
@@ -1,51 +1,171 @@
 # --------------------------- miner.py -----------------------
 import time
 import hashlib
+import threading
 from block import Block
+from pow_engine import search_nonce
+from tensor_store import TensorStore
+from model import StreamingAggregator, aggregate_cache
+
+# how often a waiting miner re-checks a cross-process stop event, which cannot notify a Condition
+STOP_POLL_INTERVAL = 0.5
 
 class Miner:
     def __init__(self, miner_id, config):
         self.id = miner_id
         self.difficulty = config.difficulty
         self.received_updates = []
+        # running FedAvg over received_updates, folded in as updates arrive
+        self.aggregator = StreamingAggregator()
         self.h = config.h
         self.delta = config.delta
         self.nd = config.nd
         self.T_wait = config.T_wait
+        self.pow_workers = config.pow_workers
+        # updates are kept on disk by digest and mmap'ed on demand
+        self.tensor_store = TensorStore(config.tensor_dir)
+        # signalled whenever received_updates grows; wait_for_updates sleeps on it
+        self.arrivals = threading.Condition()
+        # True while a round's uploads are still being delivered (open_intake .. close_intake)
+        self.intake_open = False
+        # one dict per round: required, collected, latency (s), timed_out, intake_closed
+        self.collection_stats = []
 
     def receive_update(self, client_id, model_update, comp_time, sample_count):
-        self.received_updates.append((client_id, model_update, comp_time, sample_count))
+        # stored once by content digest; cross_verify and blocks share the same reference
+        update = (client_id, self.tensor_store.put(model_update), comp_time, sample_count)
+        with self.arrivals:
+            self.received_updates.append(update)
+            self.aggregator.add(update[1], sample_count)
+            self.arrivals.notify_all()
+
+    def reset_updates(self, committed=None):
+        """
+        Forget collected updates so the next block only carries the ones received after this.
+        Updates not in `committed` (the block the next round builds on) are reported as dropped.
+        """
+        with self.arrivals:
+            included = {update[0] for update in committed.model_updates} if committed is not None else set()
+            dropped = sum(1 for update in self.received_updates if update[0] not in included)
+            if dropped:
+                print(f"[Miner {self.id}] Dropping {dropped} update(s) that missed the last block")
+            self.received_updates = []
+            self.aggregator = StreamingAggregator()
+
+    def open_intake(self):
+        """Start a round: uploads may arrive while this miner waits in wait_for_updates."""
+        with self.arrivals:
+            self.intake_open = True
+
+    def close_intake(self):
+        """Every upload of the round has been delivered; wake a waiting miner so it stops waiting."""
+        with self.arrivals:
+            self.intake_open = False
+            self.arrivals.notify_all()
 
     def cross_verify(self, all_miners):
-        known_clients = set(update[0] for update in self.received_updates)
-        for miner in all_miners:
-            if miner.id != self.id:
-                for update in miner.received_updates:
-                    client_id = update[0]
-                    if client_id not in known_clients:
-                        self.received_updates.append(update)
-                        known_clients.add(client_id)
+        with self.arrivals:
+            known_clients = set(update[0] for update in self.received_updates)
+            for miner in all_miners:
+                if miner.id != self.id:
+                    for update in list(miner.received_updates):
+                        client_id = update[0]
+                        if client_id not in known_clients:
+                            self.received_updates.append(update)
+                            self.aggregator.add(update[1], update[3])
+                            known_clients.add(client_id)
+            self.arrivals.notify_all()
         print(f"[Miner {self.id}] Verified {len(self.received_updates)} updates")
 
-    def mine_block(self, prev_hash):
-        required_size = int(self.h + self.delta * self.nd)
-        print(f"[Miner {self.id}] Waiting to collect {required_size} updates or until timeout {self.T_wait}s")
-
-        start_time = time.time()
-        while len(self.received_updates) < required_size:
-            if time.time() - start_time >= self.T_wait:
-                print(f"[Miner {self.id}] Timeout reached with {len(self.received_updates)} updates. Proceeding to PoW...")
-                break
-            time.sleep(0.1)  # brief sleep to simulate waiting
-
-        print(f"[Miner {self.id}] Starting PoW with {len(self.received_updates)} updates...")
-        nonce = 0
-        while True:
-            timestamp = time.time()
-            block = Block(self.id, self.received_updates, prev_hash, nonce, timestamp)
-            block_hash = block.compute_hash()
-            if block_hash.startswith(self.difficulty):
-                block.hash = block_hash
-                print(f"[Miner {self.id}] Found valid block with nonce {nonce} at {block.hash}")
-                return block
-            nonce += 1
+    def required_size(self):
+        return int(self.h + self.delta * self.nd)
+
+    def wait_for_updates(self, deadline=None, stop_event=None):
+        """
+        Wait until the update quota is met or no more updates can come: the
+        intake is closed, or `deadline` (a time.time() value) passes. With
+        deadline=None only the intake ends the wait, so however long the
+        round's training takes, every upload still gets its chance. Wakes up
+        on every arrival instead of polling, so PoW can start the moment the
+        quota is reached. A miner with no updates at all keeps waiting past the
+        deadline for the first one. Returns False if stop_event is set while waiting.
+        """
+        required_size = self.required_size()
+        until = "the round's uploads are in" if deadline is None else f"timeout {self.T_wait}s"
+        print(f"[Miner {self.id}] Waiting to collect {required_size} updates or until {until}")
+
+        start = time.time()
+        def stopped():
+            return stop_event is not None and stop_event.is_set()
+
+        with self.arrivals:
+            while len(self.received_updates) < required_size and self.intake_open and not stopped():
+                remaining = STOP_POLL_INTERVAL if deadline is None else deadline - time.time()
+                if remaining <= 0:
+                    if self.received_updates:
+                        break
+                    # an empty block carries no model, so past the deadline the first upload is taken
+                    remaining = STOP_POLL_INTERVAL
+                if stop_event is not None:
+                    remaining = min(remaining, STOP_POLL_INTERVAL)
+                self.arrivals.wait(remaining)
+            collected = len(self.received_updates)
+            intake_closed = not self.intake_open
+
+        if stopped():
+            print(f"[Miner {self.id}] Round closed while collecting. Aborting.")
+            return False
+        stats = {
+            "required": required_size,
+            "collected": collected,
+            "latency": time.time() - start,
+            "timed_out": collected < required_size and not intake_closed,
+            "intake_closed": intake_closed,
+        }
+        self.collection_stats.append(stats)
+        if stats["timed_out"]:
+            print(f"[Miner {self.id}] Timeout reached with {collected} updates. Proceeding to PoW...")
+        elif collected < required_size:
+            print(f"[Miner {self.id}] All uploads delivered with {collected} updates. Proceeding to PoW...")
+        print(f"[Miner {self.id}] Collection latency {stats['latency'] * 1000:.1f} ms ({collected}/{required_size} updates)")
+        return True
+
+    def prepare_block(self, prev_hash):
+        """Snapshot the collected updates into an unmined block on top of prev_hash."""
+        # uploads may still be arriving, so snapshot under the lock
+        with self.arrivals:
+            updates = list(self.received_updates)
+        print(f"[Miner {self.id}] Starting PoW with {len(updates)} updates on {self.pow_workers} worker(s)...")
+        block = Block(self.id, updates, prev_hash, 0, time.time(), difficulty=self.difficulty)
+        # updates are digested once here; the PoW loop only sees the constant-size header
+        block.compute_merkle_root()
+        return block
+
+    def finalize_block(self, block, result):
+        """Seal `block` with a PowResult. Returns None if the search was cancelled."""
+        if result is None:
+            print(f"[Miner {self.id}] Round closed by another miner. Aborting PoW.")
+            return None
+        for wid, rate in result.hash_rates().items():
+            print(f"[Miner {self.id}] PoW worker {wid}: {rate:,.0f} H/s")
+
+        block.nonce = result.nonce
+        block.timestamp = result.timestamp
+        block.hash = result.hash
+        with self.arrivals:
+            if self.aggregator.num_updates == len(block.model_updates):
+                # nothing arrived since prepare_block, so the running aggregate is this block's
+                aggregate_cache.put(block.hash, self.aggregator.result())
+        print(f"[Miner {self.id}] Found valid block with nonce {result.nonce} at {block.hash}")
+        return block
+
+    def mine_block(self, prev_hash, stop_event=None):
+        """
+        Collect updates, then run PoW on top of prev_hash in this process.
+        Returns None if stop_event is set before a block is found.
+        """
+        if not self.wait_for_updates(time.time() + self.T_wait, stop_event):
+            return None
+        block = self.prepare_block(prev_hash)
+        result = search_nonce(block.header(), self.difficulty, self.pow_workers, stop_event)
+        return self.finalize_block(block, result)
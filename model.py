@@ -1,7 +1,8 @@
 import torch.nn as nn
 import torch.nn.functional as F
 import torch
-import copy
+from collections import OrderedDict
+from update_store import FlatUpdate, SparseUpdate, flatten_update, layout_sizes
 
 class SimpleCNN(nn.Module):
     def __init__(self):
@@ -23,12 +24,95 @@ class SimpleCNN(nn.Module):
 def initialize_model():
     return SimpleCNN()
 
+class StreamingAggregator:
+    """
+    Running sample-weighted sum of updates for FedAvg.
+
+    Each update is viewed as one flat vector per dtype and folded into a single
+    accumulator with in-place add_(alpha=samples), so memory stays at one model
+    no matter how many updates are added. SparseUpdates are scattered in with
+    index_add_ instead.
+    """
+    def __init__(self):
+        self.spec = None
+        self.acc = None
+        self.num_samples = 0
+        self.num_updates = 0
+
+    def add(self, update, sample_count):
+        if not isinstance(update, SparseUpdate):
+            update = flatten_update(update)
+        if self.spec is None:
+            self.spec = update.spec
+            # integer entries (e.g. counters) average to float, as plain tensor division would
+            self.acc = {dtype: torch.zeros(n, dtype=dtype if dtype.is_floating_point else torch.float32)
+                        for dtype, n in layout_sizes(update.spec).items()}
+        elif not update.same_layout(self):
+            raise ValueError("cannot aggregate updates with different parameter layouts")
+        if isinstance(update, SparseUpdate):
+            # only the kept entries are touched, so a sparse update costs O(nnz)
+            for dtype, idx in update.indices.items():
+                self.acc[dtype].index_add_(0, idx, update.values[dtype].to(self.acc[dtype].dtype), alpha=sample_count)
+        else:
+            for dtype, buf in update.buffers.items():
+                self.acc[dtype].add_(buf, alpha=sample_count)
+        self.num_samples += sample_count
+        self.num_updates += 1
+
+    def result(self):
+        """Weighted average of everything added so far, as a new FlatUpdate."""
+        if self.acc is None:
+            raise ValueError("no updates to aggregate")
+        return FlatUpdate({dtype: buf / self.num_samples for dtype, buf in self.acc.items()}, self.spec)
+
+
 def aggregate_updates(model_updates):
-    num_samples = sum(s for _, _, _, s in model_updates)
-    agg = copy.deepcopy(model_updates[0][1])
-    for key in agg.keys():
-        agg[key] = sum(update[1][key] * update[3] for update in model_updates) / num_samples
-    return agg
+    """
+    Sample-weighted FedAvg over (client_id, update_dict, comp_time, sample_count) entries.
+    Updates may be full models or (sparse) deltas; the result is a FlatUpdate either way.
+    """
+    agg = StreamingAggregator()
+    for _, update, _, sample_count in model_updates:
+        agg.add(update, sample_count)
+    return agg.result()
+
+class AggregateCache:
+    """
+    LRU cache of aggregated global models keyed by block hash.
+
+    Block hashes commit to their updates (via the Merkle root), so a hash
+    names exactly one aggregate. Entries are kept in shared memory and
+    handed out read-only; callers copy them with load_state_dict.
+    """
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, block_hash, aggregated):
+        for buf in aggregated.buffers.values():
+            buf.share_memory_()
+        self.entries[block_hash] = aggregated
+        self.entries.move_to_end(block_hash)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def get(self, block_hash, compute):
+        """Return the aggregate for block_hash, calling compute() only on a miss."""
+        if block_hash in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(block_hash)
+            return self.entries[block_hash]
+        self.misses += 1
+        aggregated = compute()
+        self.put(block_hash, aggregated)
+        return aggregated
+
+
+# process-wide cache; main.py sizes it from config
+aggregate_cache = AggregateCache()
+
 
 def evaluate(state_dict, test_loader, config):
     model = initialize_model()
@@ -0,0 +1,117 @@
+# partition.py
+# Split a labelled dataset across clients (IID or skewed), with the result cached on disk
+import hashlib
+import json
+import os
+import numpy as np
+
+# Dirichlet draws that leave a client empty are redrawn up to this many times
+MAX_DRAWS = 100
+# part of every cache key; bump when a partitioner's output changes so stale splits are not loaded
+CACHE_VERSION = 2
+
+
+def iid_partition(labels, num_clients, rng):
+    """Equal random split; leftover samples (len % num_clients) are unused, as with random_split."""
+    size = len(labels) // num_clients
+    order = rng.permutation(len(labels))
+    return _split(order[:size * num_clients], np.full(num_clients, size))
+
+
+def dirichlet_partition(labels, num_clients, rng, alpha=0.5):
+    """
+    Label skew: each class is spread over clients by proportions drawn from
+    Dir(alpha). Small alpha gives clients few classes; large alpha tends to IID.
+    """
+    by_class = _group_by_label(labels)
+    for _ in range(MAX_DRAWS):
+        props = rng.dirichlet(np.full(num_clients, alpha), size=len(by_class))
+        # per class, how many of its samples each client gets
+        counts = np.stack([_proportional_counts(len(idx), p) for idx, p in zip(by_class, props)])
+        if counts.sum(axis=0).min() > 0:
+            break
+    else:
+        raise ValueError(f"dirichlet alpha={alpha} keeps leaving clients empty; raise alpha or lower num_clients")
+
+    # tag every sample with its client, then group by client with one stable sort
+    samples = np.concatenate([rng.permutation(idx) for idx in by_class])
+    owners = np.concatenate([np.repeat(np.arange(num_clients), c) for c in counts])
+    flat = samples[np.argsort(owners, kind="stable")]
+    return _split(flat, counts.sum(axis=0))
+
+
+def quantity_partition(labels, num_clients, rng, alpha=0.5):
+    """Quantity skew: IID samples, but client sizes follow Dir(alpha) proportions (at least one each)."""
+    n = len(labels)
+    sizes = 1 + _proportional_counts(n - num_clients, rng.dirichlet(np.full(num_clients, alpha)))
+    return _split(rng.permutation(n), sizes)
+
+
+def shard_partition(labels, num_clients, rng, shards_per_client=2):
+    """
+    Pathological non-IID split (McMahan et al.): sort by label, cut into
+    num_clients * shards_per_client equal shards, deal shards out at random.
+    """
+    num_shards = num_clients * shards_per_client
+    shard_size = len(labels) // num_shards
+    # stable sort of small integer labels is a radix sort in NumPy, so O(N)
+    order = np.argsort(labels, kind="stable")[:num_shards * shard_size].reshape(num_shards, shard_size)
+    flat = order[rng.permutation(num_shards)].reshape(-1)
+    return _split(flat, np.full(num_clients, shards_per_client * shard_size))
+
+
+PARTITIONERS = {
+    "iid": iid_partition,
+    "dirichlet": dirichlet_partition,
+    "quantity": quantity_partition,
+    "shards": shard_partition,
+}
+
+
+def _group_by_label(labels):
+    order = np.argsort(labels, kind="stable")
+    bounds = np.cumsum(np.bincount(labels))
+    return np.split(order, bounds[:-1])
+
+
+def _proportional_counts(n, props):
+    """Split n into integer counts following props (largest remainder), summing to n exactly."""
+    exact = props * n
+    counts = np.floor(exact).astype(np.int64)
+    short = n - counts.sum()
+    if short:
+        counts[np.argsort(counts - exact)[:short]] += 1
+    return counts
+
+
+def _split(flat, sizes):
+    return np.split(flat, np.cumsum(sizes)[:-1])
+
+
+def partition(labels, num_clients, scheme="iid", seed=0, cache_dir=None, **params):
+    """
+    Return one index array per client. With cache_dir, the result is stored as
+    one flat index array plus sizes, keyed by (seed, scheme, num_clients) and
+    the scheme's parameters, and later calls with the same key just load it.
+    """
+    if scheme not in PARTITIONERS:
+        raise ValueError(f"unknown partition scheme {scheme!r}; expected one of {list(PARTITIONERS)}")
+    labels = np.asarray(labels)
+
+    path = None
+    if cache_dir is not None:
+        # dataset size and parameters are part of the key too, so a changed alpha never reads a stale split
+        key = json.dumps([CACHE_VERSION, seed, scheme, num_clients, len(labels), sorted(params.items())])
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"{scheme}-{num_clients}-{seed}-{digest}.npz")
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                return _split(cached["indices"], cached["sizes"])
+
+    parts = PARTITIONERS[scheme](labels, num_clients, np.random.default_rng(seed), **params)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.npz"
+        np.savez(tmp, indices=np.concatenate(parts), sizes=np.array([len(p) for p in parts]))
+        os.replace(tmp, path)
+    return parts
@@ -0,0 +1,117 @@
+# pow_engine.py
+# Multi-process nonce search used by Miner.mine_block
+import time
+import queue
+import multiprocessing as mp
+from block import NonceHasher
+
+# how many nonces a worker hashes between checks of the shared stop flag
+CHECK_INTERVAL = 1024
+# how long search_nonce waits for a result before checking that its workers are still alive
+RESULT_TIMEOUT = 1.0
+
+
+class PowResult:
+    def __init__(self, nonce, block_hash, timestamp, worker_stats):
+        self.nonce = nonce
+        self.hash = block_hash
+        self.timestamp = timestamp
+        # list of (worker_id, hashes, elapsed_seconds)
+        self.worker_stats = worker_stats
+
+    def hash_rates(self):
+        """Return hashes/sec for every worker, keyed by worker id."""
+        return {wid: (hashes / elapsed if elapsed > 0 else 0.0) for wid, hashes, elapsed in self.worker_stats}
+
+    def total_hash_rate(self):
+        return sum(self.hash_rates().values())
+
+
+def _scan(header, difficulty, start, step, stop_events):
+    """
+    Hash nonces start, start+step, start+2*step, ... until one meets the
+    difficulty prefix or any of stop_events is set.
+    Returns (nonce, hash, hashes_done); nonce/hash are None when cancelled.
+    """
+    hasher = NonceHasher(header)
+    nonce = start
+    hashes = 0
+    while True:
+        for _ in range(CHECK_INTERVAL):
+            block_hash = hasher.hash(nonce)
+            hashes += 1
+            if block_hash.startswith(difficulty):
+                return nonce, block_hash, hashes
+            nonce += step
+        if any(e.is_set() for e in stop_events):
+            return None, None, hashes
+
+
+def _worker(worker_id, num_workers, header, difficulty, found, stop_event, results):
+    start = time.time()
+    stop_events = (found,) if stop_event is None else (found, stop_event)
+    nonce, block_hash, hashes = _scan(header, difficulty, worker_id, num_workers, stop_events)
+    elapsed = time.time() - start
+    if nonce is not None:
+        found.set()
+    results.put((worker_id, nonce, block_hash, hashes, elapsed))
+
+
+def search_nonce(header, difficulty, num_workers=1, stop_event=None):
+    """
+    Find a nonce for `header` (a Block.header() dict) whose block hash
+    starts with `difficulty`.
+
+    The nonce space is interleaved across `num_workers` processes (worker i
+    tries i, i+W, i+2W, ...). The first worker to find a valid hash sets a
+    shared event and the others stop at their next check.
+
+    `stop_event` is an optional multiprocessing.Event set from outside (e.g.
+    when another miner already won the round). Returns None if it fires
+    before a valid nonce is found. Raises RuntimeError if a worker dies
+    without reporting.
+    """
+    if num_workers <= 1:
+        start = time.time()
+        stop_events = () if stop_event is None else (stop_event,)
+        nonce, block_hash, hashes = _scan(header, difficulty, 0, 1, stop_events)
+        if nonce is None:
+            return None
+        return PowResult(nonce, block_hash, header['timestamp'], [(0, hashes, time.time() - start)])
+
+    found = mp.Event()
+    results = mp.Queue()
+    workers = []
+    for wid in range(num_workers):
+        p = mp.Process(target=_worker,
+                       args=(wid, num_workers, header, difficulty, found, stop_event, results))
+        p.start()
+        workers.append(p)
+
+    winner = None
+    stats = []
+    pending = set(range(num_workers))
+    while pending:
+        try:
+            wid, nonce, block_hash, hashes, elapsed = results.get(timeout=RESULT_TIMEOUT)
+        except queue.Empty:
+            # a worker that crashed or was killed never reports; don't wait for it forever
+            dead = [w for w in pending if workers[w].exitcode not in (None, 0)]
+            if dead:
+                found.set()
+                for p in workers:
+                    p.join()
+                raise RuntimeError(f"PoW worker {dead[0]} died with exit code {workers[dead[0]].exitcode}")
+            continue
+        pending.discard(wid)
+        stats.append((wid, hashes, elapsed))
+        # several workers may hit a valid hash before seeing the event; keep the lowest nonce
+        if nonce is not None and (winner is None or nonce < winner[0]):
+            winner = (nonce, block_hash)
+    for p in workers:
+        p.join()
+
+    if winner is None:
+        return None
+    stats.sort()
+    return PowResult(winner[0], winner[1], header['timestamp'], stats)
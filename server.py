@@ -2,33 +2,140 @@
 # server.py
 from chain import Blockchain
 from block import genesis_block
+from block_store import BlockLog
+from tensor_store import TensorStore, StoredSparseUpdate
+from model import initialize_model, AggregateCache
+from update_store import FlatUpdate, share_update
 import json
 
 class Server:
     def __init__(self, config):
-        # Create a genesis block and initialize the fork-aware blockchain
-        g = genesis_block()
-        # difficulty is handled by miners; chain logic uses work=1 per block
-        self.blockchain = Blockchain(g, difficulty=config.difficulty)
         self.config = config
+        # with resume, keep the existing block log and rebuild the chain from it
+        self.store = BlockLog(config.store_dir, config.fsync_every, fresh=not config.resume)
+        if not config.resume:
+            # a fresh log references none of the update files earlier runs left behind
+            removed, freed = TensorStore(config.tensor_dir).collect()
+            if removed:
+                print(f"[Server] Removed {removed} update files of a previous run ({freed / 2**20:.1f} MiB)")
+        stored = self.store.hashes()
+        if stored:
+            g = self.store.load_block(stored[0])
+        elif config.update_mode == "delta":
+            # deltas need a common starting point, so genesis carries the initial model
+            g = genesis_block([(-1, share_update(initialize_model().state_dict()), 0.0, 1)])
+            self.store.append(g)
+        else:
+            # Create a genesis block and initialize the fork-aware blockchain
+            g = genesis_block()
+            self.store.append(g)
+        # difficulty is handled by miners; the chain weighs each block by the difficulty it records
+        self.blockchain = Blockchain(g, difficulty=config.difficulty,
+                                     max_orphans=config.max_orphans, orphan_max_age=config.orphan_max_age)
+        # block whose aggregated model is currently applied as the global model
+        self.applied_block = g
+        # with delta updates: full models reconstructed per block hash (genesis + the deltas on its branch)
+        self.models = AggregateCache(config.aggregate_cache_size)
+        self.blockchain.reorg_listeners.append(self.apply_reorg)
+        if stored:
+            self._replay(stored[1:])
+        # every attached block (including reconnected orphans) is appended to the log as it lands
+        self.blockchain.block_listeners.append(self.store.append)
+
+    def _replay(self, hashes):
+        """
+        Rebuild the block tree from stored headers. Payloads stay in the log;
+        only the tip's is read, when its aggregated model is first needed.
+        """
+        for block_hash in hashes:
+            block = self.store.load_block(block_hash)
+            if block.compute_hash() != block_hash:
+                raise ValueError(f"stored block {block_hash[:8]} does not match its header hash")
+            self.blockchain.add_block(block)
+        self.blockchain.prune(self.config.finality_depth)
+        print(f"[Server] Resumed {len(hashes) + 1} stored blocks. Height={self.blockchain.get_height()}")
 
     def add_block(self, block):
         """
         Add a mined block to the fork-aware blockchain.
         Handles forks and orphan blocks internally.
         """
-        added = self.blockchain.add_block(block)
-        if added:
+        # a block that is not attached (duplicate, invalid or orphaned) is logged by the chain with the reason
+        if self.blockchain.add_block(block):
+            self.blockchain.prune(self.config.finality_depth, self.offload_payload)
             print(f"[Server] Block {block.hash[:8]} added by Miner {block.miner_id}. Height={self.blockchain.get_height()}")
-        else:
-            print(f"[Server] Block {block.hash[:8]} is orphaned (parent missing).")
+
+    def offload_payload(self, block):
+        """Finalized blocks keep only their header in memory; the payload is already in the log."""
+        block.release_payload(lambda: self.store.read_payload(block.hash))
+
+    def apply_reorg(self, reorg):
+        """
+        Move the applied global model along a Reorg.
+        Every block's aggregate is a complete model (and memoized by hash), so
+        undoing the disconnected blocks and redoing the connected ones only
+        has to land on the new tip; intermediate blocks are never aggregated.
+        """
+        if reorg.disconnected:
+            print(f"[Server] Reorg: rolling back {len(reorg.disconnected)} block(s) to ancestor {reorg.ancestor.hash[:8]}")
+        if reorg.connected:
+            print(f"[Server] Reorg: applying {len(reorg.connected)} block(s) up to {reorg.connected[-1].hash[:8]}")
+        self.applied_block = reorg.connected[-1] if reorg.connected else reorg.ancestor
+
+    def global_model(self):
+        """Model at the applied block, or None while only an empty genesis is applied."""
+        return self.model_at(self.applied_block)
+
+    def model_at(self, block):
+        """
+        Full model at `block`. With full-model updates that is the block's own
+        aggregate. With delta updates it is genesis' initial model plus every
+        aggregated delta down the branch: the walk stops at the nearest block
+        whose model is still cached, so a new tip costs one delta.
+        """
+        if self.config.update_mode != "delta":
+            return block.aggregate() if block.model_updates else None
+        path = []
+        node = self.blockchain.index[block.hash]
+        while node.block.hash not in self.models.entries and node.parent is not None:
+            path.append(node.block)
+            node = node.parent
+        state = self.models.get(node.block.hash, node.block.aggregate)
+        for b in reversed(path):
+            delta = b.aggregate()
+            state = FlatUpdate({dtype: buf + delta.buffers[dtype] for dtype, buf in state.buffers.items()}, state.spec)
+            self.models.put(b.hash, state)
+        return state
 
     def get_chain(self):
         """Return the canonical chain (longest chain)."""
         return self.blockchain.chain
 
+    def collect_tensors(self):
+        """
+        Delete update files no stored block references: updates that never made it
+        into a block and those only orphans carried. Blocks of pruned forks stay
+        in the log, so their files are kept and the log still validates.
+        """
+        keep = set()
+        for block_hash in self.store.hashes():
+            for _, update, _, _ in self.store.read_payload(block_hash):
+                digest = getattr(update, "digest", None)
+                if digest is not None:
+                    keep.add((digest, isinstance(update, StoredSparseUpdate)))
+        removed, freed = TensorStore(self.config.tensor_dir).collect(keep)
+        print(f"[Server] Removed {removed} unreferenced update files ({freed / 2**20:.1f} MiB)")
+
+    def close(self):
+        """Flush and fsync the block log."""
+        self.store.close()
+        print(f"[Server] Block log synced to {self.store.log_path} ({len(self.store)} blocks)")
+
     def save_chain_to_file(self, filename):
-        """Save canonical chain to a JSON file."""
+        """
+        Export the canonical chain's headers to a JSON file for inspection.
+        Blocks are already persisted by the block log as they are added.
+        """
         json_chain = []
         for b in self.blockchain.chain:
             json_chain.append({
@@ -36,7 +143,9 @@ class Server:
                 "timestamp": b.timestamp,
                 "nonce": b.nonce,
                 "hash": b.hash,
-                "previous_hash": b.previous_hash
+                "previous_hash": b.previous_hash,
+                "merkle_root": b.merkle_root,
+                "difficulty": b.difficulty
             })
         with open(filename, 'w') as f:
             json.dump(json_chain, f, indent=4)
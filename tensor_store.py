@@ -0,0 +1,232 @@
+# tensor_store.py
+# Content-addressed on-disk store for model updates, read back through mmap
+import json
+import mmap
+import os
+import re
+import struct
+import torch
+from merkle import tensor_digest
+from update_store import FlatUpdate, SparseUpdate
+
+# safetensors dtype names
+DTYPES = {
+    torch.float64: "F64", torch.float32: "F32", torch.float16: "F16", torch.bfloat16: "BF16",
+    torch.int64: "I64", torch.int32: "I32", torch.int16: "I16", torch.int8: "I8",
+    torch.uint8: "U8", torch.bool: "BOOL",
+}
+DTYPE_NAMES = {name: dtype for dtype, name in DTYPES.items()}
+HEADER_LEN = struct.Struct("<Q")
+# store file names: <digest>[.sparse].safetensors, plus leftovers of interrupted writes
+STORE_FILE = re.compile(r"^([0-9a-f]{64})(\.sparse)?\.safetensors(\.tmp\d+)?$")
+# safetensors' free-form string metadata entry
+METADATA = "__metadata__"
+
+
+class TensorStore:
+    """
+    Stores each update once under its tensor digest, as a safetensors-style
+    file: u64 header length, JSON header (name -> dtype, shape, data_offsets),
+    then the raw tensor bytes grouped by dtype.
+
+    A SparseUpdate is stored as its per-dtype index and value tensors, with
+    the dense layout in the header metadata; it keeps the digest of the dense
+    update it stands for, in a file of its own (`<digest>.sparse.safetensors`)
+    so it never shadows, or is shadowed by, the dense file of equal content.
+    """
+    def __init__(self, directory):
+        # stored updates pickle their directory into block payloads, which are read
+        # back by other processes (validate_chain, a resumed run) from any cwd
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, digest, sparse=False):
+        suffix = ".sparse.safetensors" if sparse else ".safetensors"
+        return os.path.join(self.directory, digest[:2], digest + suffix)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def files(self):
+        """Yield (path, digest, sparse, complete) for every store file; other files are never touched."""
+        for sub in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, sub)
+            if len(sub) != 2 or not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                m = STORE_FILE.match(name)
+                if m is not None and m.group(1).startswith(sub):
+                    yield os.path.join(subdir, name), m.group(1), m.group(2) is not None, m.group(3) is None
+
+    def collect(self, keep=()):
+        """
+        Delete every store file whose (digest, sparse) key is not in `keep`, and
+        any partial writes. Returns (files removed, bytes freed).
+        """
+        keep = set(keep)
+        removed = freed = 0
+        for path, digest, sparse, complete in list(self.files()):
+            if complete and (digest, sparse) in keep:
+                continue
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+        return removed, freed
+
+    def put(self, state_dict):
+        """Store a state dict (if not already present) and return a lazy StoredUpdate for it."""
+        if isinstance(state_dict, (StoredUpdate, StoredSparseUpdate)):
+            return state_dict
+        digest = tensor_digest(state_dict)
+        sparse = isinstance(state_dict, SparseUpdate)
+        path = self.path(digest, sparse)
+        if sparse:
+            if not os.path.exists(path):
+                tensors = {}
+                for dtype in state_dict.indices:
+                    tensors[f"{DTYPES[dtype]}.indices"] = state_dict.indices[dtype]
+                    tensors[f"{DTYPES[dtype]}.values"] = state_dict.values[dtype]
+                spec = [[name, DTYPES[dtype], list(shape), offset, numel]
+                        for name, dtype, shape, offset, numel in state_dict.spec]
+                self._write(path, tensors, {"format": "sparse", "spec": json.dumps(spec)})
+            return StoredSparseUpdate(self.directory, digest)
+        if not os.path.exists(path):
+            self._write(path, state_dict)
+        return StoredUpdate(self.directory, digest)
+
+    def _write(self, path, state_dict, metadata=None):
+        # group by dtype (widest first, so every region stays aligned) so each dtype's
+        # tensors form one contiguous region; the header keeps the state dict's order
+        names = sorted(state_dict.keys(), key=lambda k: -state_dict[k].element_size())
+        offsets = {}
+        offset = 0
+        for name in names:
+            t = state_dict[name]
+            nbytes = t.numel() * t.element_size()
+            offsets[name] = [offset, offset + nbytes]
+            offset += nbytes
+        header = {name: {"dtype": DTYPES[t.dtype], "shape": list(t.shape), "data_offsets": offsets[name]}
+                  for name, t in state_dict.items()}
+        if metadata is not None:
+            header[METADATA] = metadata
+        header_bytes = json.dumps(header).encode()
+        # pad so tensor data starts 8-byte aligned, as safetensors does
+        header_bytes += b" " * (-(HEADER_LEN.size + len(header_bytes)) % 8)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(HEADER_LEN.pack(len(header_bytes)))
+            f.write(header_bytes)
+            for name in names:
+                t = state_dict[name].detach().cpu().contiguous()
+                f.write(t.reshape(-1).view(torch.uint8).numpy().tobytes())
+        # readers only ever see complete files
+        os.replace(tmp, path)
+
+
+def _map(directory, digest, sparse=False):
+    """mmap a store file copy-on-write; return (header, mapping, offset of the tensor data)."""
+    with open(TensorStore(directory).path(digest, sparse), "rb") as f:
+        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (hlen,) = HEADER_LEN.unpack_from(view, 0)
+    header = json.loads(view[HEADER_LEN.size:HEADER_LEN.size + hlen])
+    return header, view, HEADER_LEN.size + hlen
+
+
+class StoredUpdate(FlatUpdate):
+    """
+    FlatUpdate backed by a TensorStore file. Nothing is read until a tensor is
+    accessed; the file is then mmap'ed copy-on-write and every dtype region is
+    exposed as one flat tensor without copying. Pickles as (directory, digest).
+    """
+    def __init__(self, directory, digest):
+        self.directory = directory
+        self.digest = digest
+        self._loaded = None
+
+    def _load(self):
+        if self._loaded is None:
+            header, view, data_start = _map(self.directory, self.digest)
+            header.pop(METADATA, None)
+
+            regions = {}
+            for name, entry in header.items():
+                dtype = DTYPE_NAMES[entry["dtype"]]
+                begin, end = entry["data_offsets"]
+                lo, hi = regions.get(dtype, (begin, end))
+                regions[dtype] = (min(lo, begin), max(hi, end))
+            buffers = {}
+            for dtype, (lo, hi) in regions.items():
+                size = torch.empty(0, dtype=dtype).element_size()
+                buffers[dtype] = torch.frombuffer(view, dtype=dtype, count=(hi - lo) // size, offset=data_start + lo)
+
+            spec = []
+            for name, entry in header.items():
+                dtype = DTYPE_NAMES[entry["dtype"]]
+                begin, end = entry["data_offsets"]
+                size = buffers[dtype].element_size()
+                spec.append((name, dtype, tuple(entry["shape"]), (begin - regions[dtype][0]) // size, (end - begin) // size))
+            self._loaded = (buffers, spec, {entry[0]: entry for entry in spec})
+        return self._loaded
+
+    @property
+    def buffers(self):
+        return self._load()[0]
+
+    @property
+    def spec(self):
+        return self._load()[1]
+
+    @property
+    def _index(self):
+        return self._load()[2]
+
+    def __reduce__(self):
+        return StoredUpdate, (self.directory, self.digest)
+
+
+class StoredSparseUpdate(SparseUpdate):
+    """SparseUpdate backed by a TensorStore file, mapped lazily like StoredUpdate."""
+    def __init__(self, directory, digest):
+        self.directory = directory
+        self.digest = digest
+        self._loaded = None
+
+    def _load(self):
+        if self._loaded is None:
+            header, view, data_start = _map(self.directory, self.digest, sparse=True)
+            metadata = header.pop(METADATA)
+            tensors = {}
+            for name, entry in header.items():
+                dtype = DTYPE_NAMES[entry["dtype"]]
+                begin, end = entry["data_offsets"]
+                count = (end - begin) // torch.empty(0, dtype=dtype).element_size()
+                tensors[name] = torch.frombuffer(view, dtype=dtype, count=count, offset=data_start + begin) \
+                    if count else torch.empty(0, dtype=dtype)
+            spec = [(name, DTYPE_NAMES[dtype], tuple(shape), offset, numel)
+                    for name, dtype, shape, offset, numel in json.loads(metadata["spec"])]
+            dtypes = {DTYPE_NAMES[name.split(".")[0]] for name in tensors}
+            indices = {dtype: tensors[f"{DTYPES[dtype]}.indices"] for dtype in dtypes}
+            values = {dtype: tensors[f"{DTYPES[dtype]}.values"] for dtype in dtypes}
+            self._loaded = (indices, values, spec, {entry[0]: entry for entry in spec})
+        return self._loaded
+
+    @property
+    def indices(self):
+        return self._load()[0]
+
+    @property
+    def values(self):
+        return self._load()[1]
+
+    @property
+    def spec(self):
+        return self._load()[2]
+
+    @property
+    def _index(self):
+        return self._load()[3]
+
+    def __reduce__(self):
+        return StoredSparseUpdate, (self.directory, self.digest)
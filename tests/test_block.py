@@ -0,0 +1,31 @@
+# tests/test_block.py
+# The midstate PoW hasher must reproduce Block.compute_hash exactly
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block, NonceHasher
+
+
+def headers():
+    plain = Block(3, [], "0" * 64, 0, 1712345678.25)
+    committed = Block(1, [], "f" * 64, 0, 1712345679.5, merkle_root="ab" * 32, difficulty="000")
+    unicode_id = Block("miner-ü", [], "1" * 64, 0, 0.0, difficulty="0")
+    return [plain, committed, unicode_id]
+
+
+def test_nonce_hasher_matches_compute_hash():
+    for block in headers():
+        hasher = block.nonce_hasher()
+        for nonce in (0, 1, 9, 10, 12345, 2 ** 31, 2 ** 64 + 7):
+            block.nonce = nonce
+            assert hasher.hash(nonce) == block.compute_hash(), (block.header(), nonce)
+
+
+def test_nonce_hasher_ignores_header_nonce():
+    block = headers()[1]
+    block.nonce = 99
+    hasher = NonceHasher(block.header())
+    block.nonce = 5
+    assert hasher.hash(5) == block.compute_hash()
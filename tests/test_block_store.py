@@ -0,0 +1,94 @@
+# tests/test_block_store.py
+# Crash recovery and payload safety of the append-only block log
+import os
+import pickle
+import sys
+import pytest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block, genesis_block
+from block_store import BlockLog, INDEX_ENTRY
+
+
+def _chain(length):
+    blocks = [genesis_block()]
+    for i in range(1, length):
+        update = {"w": torch.full((4,), float(i))}
+        block = Block(i % 3, [(i, update, 0.0, 1)], blocks[-1].hash, i, float(i))
+        block.hash = block.compute_hash()
+        blocks.append(block)
+    return blocks
+
+
+def _write(directory, blocks):
+    log = BlockLog(directory)
+    for block in blocks:
+        log.append(block)
+    log.close()
+
+
+def test_index_past_log_end_is_dropped(tmp_path):
+    blocks = _chain(4)
+    _write(tmp_path, blocks)
+    log_path = os.path.join(tmp_path, "chain.log")
+    # crash after the index entry hit the disk but before the last record did
+    cut = os.path.getsize(log_path) - 10
+    os.truncate(log_path, cut)
+
+    log = BlockLog(tmp_path)
+    assert log.hashes() == [b.hash for b in blocks[:-1]]
+    assert os.path.getsize(log_path) <= cut
+    for block in blocks[1:-1]:
+        assert torch.equal(log.read_payload(block.hash)[0][1]["w"], block.model_updates[0][1]["w"])
+    # the log keeps appending after the last intact record
+    log.append(blocks[-1])
+    log.close()
+
+    log = BlockLog(tmp_path, readonly=True)
+    assert log.hashes() == [b.hash for b in blocks]
+    assert log.read_header(blocks[-1].hash)["hash"] == blocks[-1].hash
+    log.close()
+
+
+def test_readonly_open_does_not_grow_log(tmp_path):
+    blocks = _chain(3)
+    _write(tmp_path, blocks)
+    log_path = os.path.join(tmp_path, "chain.log")
+    cut = os.path.getsize(log_path) - 10
+    os.truncate(log_path, cut)
+
+    log = BlockLog(tmp_path, readonly=True)
+    assert log.hashes() == [b.hash for b in blocks[:-1]]
+    log.close()
+    assert os.path.getsize(log_path) == cut
+
+
+def test_missing_index_entries_are_rebuilt(tmp_path):
+    blocks = _chain(3)
+    _write(tmp_path, blocks)
+    # crash before the index caught up: the last entry and a torn half entry are gone
+    index_path = os.path.join(tmp_path, "chain.idx")
+    os.truncate(index_path, os.path.getsize(index_path) - 30)
+
+    log = BlockLog(tmp_path)
+    assert log.hashes() == [b.hash for b in blocks]
+    log.close()
+    assert os.path.getsize(index_path) % INDEX_ENTRY.size == 0
+
+
+class _Exploit:
+    def __reduce__(self):
+        return os.system, ("exit 0",)
+
+
+def test_payload_cannot_run_code(tmp_path):
+    block = genesis_block()
+    block.model_updates = [(0, _Exploit(), 0.0, 1)]
+    _write(tmp_path, [block])
+
+    log = BlockLog(tmp_path, readonly=True)
+    with pytest.raises(pickle.UnpicklingError):
+        log.read_payload(block.hash)
+    log.close()
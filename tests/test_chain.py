@@ -0,0 +1,145 @@
+# tests/test_chain.py
+# Fork choice, orphan reconnection, reorgs and pruning of the block tree
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chain as chain_module
+from block import Block, genesis_block
+from chain import Blockchain, OrphanPool
+
+
+def mine(parent, difficulty="0", miner_id=0):
+    """A block on top of `parent` that meets `difficulty` (work 16 per leading zero)."""
+    block = Block(miner_id, [], parent.hash, 0, float(miner_id), difficulty=difficulty)
+    while True:
+        block.hash = block.compute_hash()
+        if block.hash.startswith(difficulty):
+            return block
+        block.nonce += 1
+
+
+def branch(parent, length, difficulty="0", miner_id=0):
+    blocks = []
+    for _ in range(length):
+        parent = mine(parent, difficulty, miner_id)
+        blocks.append(parent)
+    return blocks
+
+
+def new_chain(**kwargs):
+    g = genesis_block()
+    return g, Blockchain(g, difficulty="0", **kwargs)
+
+
+def hashes(blocks):
+    return [b.hash for b in blocks]
+
+
+def test_out_of_order_blocks_reconnect():
+    g, chain = new_chain()
+    b1, b2, b3 = branch(g, 3)
+    assert not chain.add_block(b3)
+    assert not chain.add_block(b2)
+    assert len(chain.orphans) == 2
+
+    assert chain.add_block(b1)
+    assert hashes(chain.chain) == hashes([g, b1, b2, b3])
+    assert len(chain.orphans) == 0
+    assert list(chain.tips) == [b3.hash]
+
+
+def test_heavier_shorter_fork_wins():
+    g, chain = new_chain()
+    long_branch = branch(g, 3, "0", miner_id=1)
+    for b in long_branch:
+        chain.add_block(b)
+    heavy = mine(g, "00", miner_id=2)
+    chain.add_block(heavy)
+
+    assert chain.get_last_block() is heavy
+    assert chain.get_height() == 2
+    assert set(chain.tips) == {long_branch[-1].hash, heavy.hash}
+
+
+def test_reorg_reports_disconnected_and_connected():
+    g, chain = new_chain()
+    reorgs = []
+    chain.reorg_listeners.append(reorgs.append)
+    a1, a2, a3 = branch(g, 3, "0", miner_id=1)
+    b2 = mine(a1, "0", miner_id=2)
+    b3 = mine(b2, "00", miner_id=2)
+    for b in (a1, a2, a3, b2, b3):
+        chain.add_block(b)
+
+    reorg = reorgs[-1]
+    assert reorg.ancestor is a1
+    assert hashes(reorg.disconnected) == hashes([a3, a2])
+    assert hashes(reorg.connected) == hashes([b2, b3])
+    assert reorg.depth == 2
+    assert hashes(chain.chain) == hashes([g, a1, b2, b3])
+
+
+def test_prune_keeps_canonical_chain():
+    g, chain = new_chain()
+    main = branch(g, 10, "0", miner_id=1)
+    stale = branch(main[1], 2, "0", miner_id=2)
+    for b in main + stale:
+        chain.add_block(b)
+    canonical = hashes(chain.chain)
+
+    offloaded = []
+    chain.prune(3, offload=offloaded.append)
+
+    assert hashes(chain.chain) == canonical
+    assert list(chain.tips) == [main[-1].hash]
+    assert all(b.hash not in chain.index for b in stale)
+    # the block the stale fork branched from is canonical and stays
+    assert main[1].hash in chain.index
+    # canonical blocks at or below height 11 - 3 are final; genesis has no payload
+    assert hashes(offloaded) == hashes(reversed(main[:7]))
+    assert chain.finalized_height == 8
+
+
+def test_orphan_pool_evicts_oldest_when_full():
+    g = genesis_block()
+    pool = OrphanPool(max_size=2)
+    orphans = [mine(g, "0", miner_id=i) for i in range(3)]
+    for b in orphans:
+        pool.add(b)
+
+    assert len(pool) == 2
+    assert orphans[0].hash not in pool
+    assert set(pool.by_parent[g.hash]) == {orphans[1].hash, orphans[2].hash}
+
+
+def test_orphan_pool_expires_old_orphans(monkeypatch):
+    g = genesis_block()
+    pool = OrphanPool(max_size=10, max_age=60.0)
+    now = [1000.0]
+    monkeypatch.setattr(chain_module.time, "time", lambda: now[0])
+    old = mine(g, "0", miner_id=1)
+    pool.add(old)
+    now[0] += 61.0
+    fresh = mine(g, "0", miner_id=2)
+    pool.add(fresh)
+
+    assert old.hash not in pool
+    assert fresh.hash in pool
+    assert pool.pop_children(g.hash) == [fresh]
+    assert g.hash not in pool.by_parent
+
+
+def test_invalid_blocks_are_rejected_not_orphaned():
+    g = genesis_block()
+    chain = Blockchain(g, difficulty="00")
+    forged = mine(g, "00")
+    forged.hash = "00" + "f" * 62
+    weak = mine(g, "0")
+    unknown_parent = mine(Block(0, [], "0", 0, 0.0), "00")
+    unknown_parent.hash = "00" + "1" * 62
+    for block in (forged, weak, unknown_parent):
+        assert not chain.add_block(block)
+    assert len(chain.orphans) == 0
+    assert chain.get_height() == 1
@@ -0,0 +1,49 @@
+# tests/test_merkle.py
+# Merkle commitments and inclusion proofs over block updates
+import hashlib
+import os
+import sys
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block import Block
+from merkle import MerkleTree, verify_proof
+
+
+def leaves(n):
+    return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(n)]
+
+
+def test_every_leaf_proves_inclusion():
+    for n in range(1, 10):
+        tree = MerkleTree(leaves(n))
+        for i, leaf in enumerate(leaves(n)):
+            proof = tree.proof(i)
+            assert verify_proof(leaf, proof, tree.root), (n, i)
+            assert len(proof) <= (n - 1).bit_length()
+
+
+def test_proof_rejects_wrong_leaf_and_root():
+    for n in range(2, 10):
+        tree = MerkleTree(leaves(n))
+        other = MerkleTree(leaves(n + 1))
+        for i in range(n):
+            proof = tree.proof(i)
+            assert not verify_proof(leaves(n)[(i + 1) % n], proof, tree.root), (n, i)
+            assert not verify_proof(leaves(n)[i], proof, other.root), (n, i)
+
+
+def test_single_leaf_is_root():
+    tree = MerkleTree(leaves(1))
+    assert tree.root == leaves(1)[0]
+    assert tree.proof(0) == []
+
+
+def test_block_proof_matches_merkle_root():
+    updates = [(i, {"w": torch.full((3,), float(i))}, 0.5, 10 + i) for i in range(5)]
+    block = Block(0, updates, "ab" * 32, 0, 1.0)
+    root = block.compute_merkle_root()
+    for i in range(len(updates)):
+        leaf, proof = block.merkle_proof(i)
+        assert verify_proof(leaf, proof, root)
@@ -0,0 +1,36 @@
+# tests/test_partition.py
+# Client partitioners and their on-disk cache
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from partition import partition, PARTITIONERS
+
+
+def labels(n=1000, classes=10):
+    return np.random.default_rng(0).integers(0, classes, n)
+
+
+def test_iid_leaves_remainder_unused():
+    parts = partition(labels(60000), 7, "iid")
+    assert [len(p) for p in parts] == [8571] * 7
+    assert len(np.unique(np.concatenate(parts))) == 7 * 8571
+
+
+def test_partitions_are_disjoint():
+    for scheme in PARTITIONERS:
+        parts = partition(labels(), 10, scheme, seed=1)
+        flat = np.concatenate(parts)
+        assert len(parts) == 10 and all(len(p) > 0 for p in parts), scheme
+        assert len(np.unique(flat)) == len(flat), scheme
+
+
+def test_cache_returns_same_split(tmp_path):
+    first = partition(labels(), 5, "dirichlet", seed=3, cache_dir=tmp_path, alpha=0.3)
+    assert len(os.listdir(tmp_path)) == 1
+    again = partition(labels(), 5, "dirichlet", seed=3, cache_dir=tmp_path, alpha=0.3)
+    assert all(np.array_equal(a, b) for a, b in zip(first, again))
+    partition(labels(), 5, "dirichlet", seed=3, cache_dir=tmp_path, alpha=0.5)
+    assert len(os.listdir(tmp_path)) == 2
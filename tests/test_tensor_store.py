@@ -0,0 +1,51 @@
+# tests/test_tensor_store.py
+# Content-addressed update files: formats, paths and garbage collection
+import os
+import sys
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tensor_store import TensorStore, StoredUpdate, StoredSparseUpdate
+from update_store import flatten_update, top_k
+
+
+def zeros():
+    return flatten_update({"w": torch.zeros(3, 4), "b": torch.zeros(4)})
+
+
+def test_dense_and_sparse_of_equal_content_do_not_collide(tmp_path):
+    for order in ((False, True), (True, False)):
+        store = TensorStore(tmp_path / str(order))
+        stored = [store.put(top_k(zeros(), 0.5) if sparse else zeros()) for sparse in order]
+        assert stored[0].digest == stored[1].digest
+        for update in stored:
+            assert torch.equal(update["w"], torch.zeros(3, 4))
+        assert isinstance(stored[order.index(True)], StoredSparseUpdate)
+
+
+def test_directory_is_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stored = TensorStore("tensors").put(zeros())
+    assert os.path.isabs(stored.directory)
+    monkeypatch.chdir("/")
+    assert torch.equal(StoredUpdate(*stored.__reduce__()[1])["b"], torch.zeros(4))
+
+
+def test_collect_keeps_only_referenced_files(tmp_path):
+    store = TensorStore(tmp_path)
+    dense = store.put(zeros())
+    sparse = store.put(top_k(flatten_update({"w": torch.ones(8)}), 0.5))
+    other = store.put(flatten_update({"w": torch.ones(2)}))
+    (tmp_path / "notes.txt").write_text("not a store file")
+    partial = store.path(other.digest) + ".tmp123"
+    open(partial, "wb").close()
+
+    removed, _ = store.collect({(dense.digest, False), (sparse.digest, True)})
+
+    assert removed == 2
+    assert os.path.exists(store.path(dense.digest))
+    assert os.path.exists(store.path(sparse.digest, sparse=True))
+    assert not os.path.exists(store.path(other.digest))
+    assert not os.path.exists(partial)
+    assert (tmp_path / "notes.txt").exists()
@@ -0,0 +1,35 @@
+# tests/test_update_store.py
+# Flat shared-memory updates and their sparse form
+import os
+import sys
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from update_store import flatten_update, share_update, top_k
+
+
+def state():
+    return {"w": torch.randn(3, 4), "b": torch.randn(4), "steps": torch.tensor([7])}
+
+
+def test_share_update_puts_buffers_in_shared_memory():
+    for update in (state(), flatten_update(state())):
+        shared = share_update(update)
+        assert all(buf.is_shared() for buf in shared.buffers.values())
+
+
+def test_flat_update_round_trips():
+    s = state()
+    flat = share_update(s)
+    assert list(flat) == list(s)
+    assert all(torch.equal(flat[k], s[k]) for k in s)
+
+
+def test_top_k_keeps_largest_and_carries_the_rest():
+    flat = flatten_update({"w": torch.tensor([0.1, -3.0, 0.2, 2.0])})
+    residual = {}
+    sparse = top_k(flat, 0.5, residual)
+    assert all(t.is_shared() for t in sparse.values.values())
+    assert torch.equal(sparse["w"], torch.tensor([0.0, -3.0, 0.0, 2.0]))
+    assert torch.allclose(residual[torch.float32], torch.tensor([0.1, 0.0, 0.2, 0.0]))
@@ -0,0 +1,153 @@
+# update_store.py
+# Model updates kept in flat shared-memory buffers so they can be passed around by handle
+from collections.abc import Mapping
+import torch
+import torch.multiprocessing
+
+# back shared buffers by named shm files rather than one open fd each;
+# thousands of client updates held by miners and blocks would exhaust fds
+torch.multiprocessing.set_sharing_strategy('file_system')
+
+
+class FlatUpdate(Mapping):
+    """
+    Read-only state dict backed by one contiguous shared-memory buffer per dtype.
+
+    Indexing returns a view into the buffer, so miners, blocks and processes
+    can all hold the same update without copying tensors. Pickling a
+    FlatUpdate through multiprocessing sends shared-memory handles, not data.
+    """
+    def __init__(self, buffers, spec):
+        # dtype -> 1-D tensor
+        self.buffers = buffers
+        # list of (name, dtype, shape, offset, numel) in state dict order
+        self.spec = spec
+        self._index = {entry[0]: entry for entry in spec}
+
+    def __getitem__(self, key):
+        _, dtype, shape, offset, numel = self._index[key]
+        return self.buffers[dtype][offset:offset + numel].view(shape)
+
+    def __iter__(self):
+        return (entry[0] for entry in self.spec)
+
+    def __len__(self):
+        return len(self.spec)
+
+    def nbytes(self):
+        return sum(b.numel() * b.element_size() for b in self.buffers.values())
+
+    def same_layout(self, other):
+        return self.spec == other.spec
+
+    def __reduce__(self):
+        return FlatUpdate, (self.buffers, self.spec)
+
+
+def flatten_update(state_dict, shared=False):
+    """
+    Copy a state dict into one flat buffer per dtype and return a FlatUpdate.
+    FlatUpdates are returned as-is; with shared=True their buffers are first
+    moved into shared memory (in place) if they are not there already.
+    """
+    if isinstance(state_dict, FlatUpdate):
+        if shared:
+            for buf in state_dict.buffers.values():
+                buf.share_memory_()
+        return state_dict
+
+    spec = []
+    sizes = {}
+    for name, t in state_dict.items():
+        offset = sizes.get(t.dtype, 0)
+        spec.append((name, t.dtype, tuple(t.shape), offset, t.numel()))
+        sizes[t.dtype] = offset + t.numel()
+
+    buffers = {dtype: torch.empty(n, dtype=dtype) for dtype, n in sizes.items()}
+    if shared:
+        buffers = {dtype: b.share_memory_() for dtype, b in buffers.items()}
+    for name, dtype, shape, offset, numel in spec:
+        buffers[dtype][offset:offset + numel].copy_(state_dict[name].detach().reshape(-1))
+    return FlatUpdate(buffers, spec)
+
+
+def share_update(state_dict):
+    """
+    Copy a state dict into flat shared-memory buffers and return a FlatUpdate.
+    This is the only copy an update goes through; it also detaches the update
+    from the live model so later training cannot mutate it. A FlatUpdate is
+    already detached, so only its buffers are moved into shared memory.
+    """
+    return flatten_update(state_dict, shared=True)
+
+
+def layout_sizes(spec):
+    """Flat buffer length per dtype for a FlatUpdate spec."""
+    sizes = {}
+    for _, dtype, _, offset, numel in spec:
+        sizes[dtype] = max(sizes.get(dtype, 0), offset + numel)
+    return sizes
+
+
+class SparseUpdate(Mapping):
+    """
+    Update that keeps only some entries of a FlatUpdate layout: per dtype, the
+    sorted flat positions and their values. Indexing densifies one tensor (so
+    it still loads and digests like a state dict); aggregation reads the
+    indices and values directly and costs O(non-zeros).
+    """
+    def __init__(self, indices, values, spec):
+        # dtype -> sorted 1-D int32 positions, and the values at them
+        self.indices = indices
+        self.values = values
+        self.spec = spec
+        self._index = {entry[0]: entry for entry in spec}
+
+    def __getitem__(self, key):
+        _, dtype, shape, offset, numel = self._index[key]
+        dense = torch.zeros(numel, dtype=dtype)
+        idx = self.indices[dtype]
+        lo, hi = torch.searchsorted(idx, torch.tensor([offset, offset + numel], dtype=idx.dtype)).tolist()
+        dense[idx[lo:hi] - offset] = self.values[dtype][lo:hi]
+        return dense.view(shape)
+
+    def __iter__(self):
+        return (entry[0] for entry in self.spec)
+
+    def __len__(self):
+        return len(self.spec)
+
+    def nnz(self):
+        return sum(v.numel() for v in self.values.values())
+
+    def nbytes(self):
+        return sum(t.numel() * t.element_size() for part in (self.indices, self.values) for t in part.values())
+
+    def same_layout(self, other):
+        return self.spec == other.spec
+
+    def __reduce__(self):
+        return SparseUpdate, (self.indices, self.values, self.spec)
+
+
+def top_k(update, ratio, residual=None):
+    """
+    Keep the largest-magnitude `ratio` of each dtype's entries of a FlatUpdate
+    as a shared-memory SparseUpdate.
+
+    With `residual` (dtype -> flat tensor, updated in place) this is error
+    feedback: the update is added to the residual, the kept entries are taken
+    out of it, and whatever was dropped is carried into the next call.
+    """
+    indices, values = {}, {}
+    for dtype, buf in update.buffers.items():
+        if residual is not None:
+            buf = residual.setdefault(dtype, torch.zeros_like(buf)).add_(buf)
+        k = max(1, int(buf.numel() * ratio))
+        idx = buf.abs().topk(k, sorted=False).indices.sort().values
+        # int32 positions keep a sparse update at 8 bytes per kept float32 entry
+        indices[dtype] = idx.to(torch.int32).share_memory_()
+        values[dtype] = buf[idx].share_memory_()
+        if residual is not None:
+            buf[idx] = 0
+    return SparseUpdate(indices, values, update.spec)
@@ -0,0 +1,198 @@
+# validate_chain.py
+# Audit a stored chain: header hashes, PoW, linkage, Merkle roots and update file contents.
+# Usage:  python validate_chain.py [store_dir | chain.json] [--workers N] [--headers-only]
+import argparse
+import json
+import os
+import pickle
+import time
+from itertools import repeat
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from block import Block
+from block_store import BlockLog
+from config import Config
+from merkle import MerkleTree, update_digest, tensor_digest
+from tensor_store import StoredUpdate, StoredSparseUpdate
+
+# block hashes per pool task; keeps IPC per block small on long chains
+CHUNK = 256
+
+# per-worker state, filled in by _init_worker
+_log = None
+
+
+def _init_worker(store_dir):
+    global _log
+    # each worker maps the log itself; only hashes go out and verdicts come back
+    _log = BlockLog(store_dir, readonly=True) if store_dir else None
+
+
+def check_header(record, difficulty):
+    """Return a list of problems with one header record (hash and PoW)."""
+    errors = []
+    block = Block.from_record(record)
+    if block.hash is None:
+        return ["missing hash"]
+    if block.compute_hash() != block.hash:
+        errors.append("hash does not match header")
+    # genesis is not mined
+    if block.previous_hash != "0":
+        prefix = block.difficulty if block.difficulty is not None else difficulty
+        if not block.hash.startswith(prefix):
+            errors.append(f"does not meet difficulty {prefix}")
+    return errors
+
+
+def _check_headers(hashes, difficulty):
+    out = []
+    for block_hash in hashes:
+        record = _log.read_header(block_hash)
+        errors = check_header(record, difficulty)
+        if record.get("hash") != block_hash:
+            errors.append("index entry points at another block")
+        out.append((block_hash, record.get("previous_hash"), errors))
+    return out
+
+
+def _check_payloads(hashes):
+    """Recompute Merkle roots from stored payloads; also return the update files they reference."""
+    out = []
+    for block_hash in hashes:
+        record = _log.read_header(block_hash)
+        errors = []
+        files = {}
+        try:
+            updates = _log.read_payload(block_hash)
+        except pickle.UnpicklingError as e:
+            # the payload wants to construct something other than updates; it is never run
+            out.append((block_hash, [f"unsafe payload ({e.__class__.__name__})"], files))
+            continue
+        # blocks mined before update commitments have no root to check
+        if record.get("merkle_root") is not None:
+            if MerkleTree([update_digest(u) for u in updates]).root != record["merkle_root"]:
+                errors.append("payload does not match merkle_root")
+        for _, update, _, _ in updates:
+            if isinstance(update, (StoredUpdate, StoredSparseUpdate)):
+                # a dense and a sparse update of equal content share a digest but not a file
+                files[update.digest, isinstance(update, StoredSparseUpdate)] = update
+        out.append((block_hash, errors, files))
+    return out
+
+
+def _check_files(updates):
+    """Re-hash stored updates through their mmap, one at a time, against the digest they are stored under."""
+    out = []
+    for update in updates:
+        try:
+            ok = tensor_digest(update) == update.digest
+            out.append((update.digest, None if ok else "content does not match digest"))
+        except (OSError, ValueError, KeyError) as e:
+            out.append((update.digest, f"unreadable ({e})"))
+    return out
+
+
+def _chunks(items):
+    return [items[i:i + CHUNK] for i in range(0, len(items), CHUNK)]
+
+
+def check_linkage(entries):
+    """
+    entries: (hash, previous_hash) in storage order. Every block but genesis must
+    link to a block stored before it (the log is appended parent-first).
+    """
+    errors = {}
+    seen = set()
+    for i, (block_hash, previous_hash) in enumerate(entries):
+        if i == 0:
+            if previous_hash != "0":
+                errors[block_hash] = ["first block is not a genesis block"]
+        elif previous_hash not in seen:
+            errors[block_hash] = [f"parent {str(previous_hash)[:8]} is not stored before it"]
+        seen.add(block_hash)
+    return errors
+
+
+def validate_log(store_dir, difficulty, workers, headers_only=False):
+    """Validate a BlockLog directory. Returns {block hash or digest: [problems]}."""
+    log = BlockLog(store_dir, readonly=True)
+    hashes = log.hashes()
+    log.close()
+    problems = {}
+
+    ctx = mp.get_context("fork")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(store_dir,)) as pool:
+        start = time.perf_counter()
+        links = []
+        for chunk in pool.map(_check_headers, _chunks(hashes), repeat(difficulty)):
+            for block_hash, previous_hash, errors in chunk:
+                links.append((block_hash, previous_hash))
+                if errors:
+                    problems[block_hash] = errors
+        for block_hash, errors in check_linkage(links).items():
+            problems.setdefault(block_hash, []).extend(errors)
+        elapsed = time.perf_counter() - start
+        print(f"[Validate] Headers: {len(hashes)} blocks in {elapsed:.2f}s ({len(hashes) / max(elapsed, 1e-9):.0f} blocks/s)")
+        if headers_only:
+            return problems
+
+        start = time.perf_counter()
+        files = {}
+        for chunk in pool.map(_check_payloads, _chunks(hashes)):
+            for block_hash, errors, block_files in chunk:
+                files.update(block_files)
+                if errors:
+                    problems.setdefault(block_hash, []).extend(errors)
+        # identical updates are stored once, so each file is re-hashed once however many blocks carry it
+        files = [files[key] for key in sorted(files)]
+        for chunk in pool.map(_check_files, [files[i::workers] for i in range(workers)]):
+            for digest, error in chunk:
+                if error:
+                    problems.setdefault(digest, []).append(error)
+        elapsed = time.perf_counter() - start
+        print(f"[Validate] Payloads: {len(hashes)} blocks, {len(files)} update files in {elapsed:.2f}s "
+              f"({len(hashes) / max(elapsed, 1e-9):.0f} blocks/s)")
+    return problems
+
+
+def validate_export(path, difficulty):
+    """Validate a JSON header export (Server.save_chain_to_file); there are no payloads to check."""
+    with open(path) as f:
+        records = json.load(f)
+    start = time.perf_counter()
+    problems = {}
+    for i, record in enumerate(records):
+        errors = check_header(record, difficulty)
+        if errors:
+            problems[record.get("hash") or f"#{i}"] = errors
+    # an export is the canonical chain, so every block links to the one before it
+    for i in range(1, len(records)):
+        if records[i].get("previous_hash") is None or records[i]["previous_hash"] != records[i - 1].get("hash"):
+            problems.setdefault(records[i].get("hash") or f"#{i}", []).append("does not link to the previous block")
+    elapsed = time.perf_counter() - start
+    print(f"[Validate] Headers: {len(records)} blocks in {elapsed:.2f}s ({len(records) / max(elapsed, 1e-9):.0f} blocks/s)")
+    return problems
+
+
+if __name__ == '__main__':
+    # defaults come from the config next to this script, so it can be run from anywhere
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+    parser = argparse.ArgumentParser(description="Validate a stored blockchain.")
+    parser.add_argument("path", nargs="?", default=config.store_dir,
+                        help="block log directory, or a chain.json export (default: chain.store_dir)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--difficulty", default=config.difficulty,
+                        help="prefix for blocks that do not record their difficulty")
+    parser.add_argument("--headers-only", action="store_true", help="skip payload and update file checks")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        problems = validate_log(args.path, args.difficulty, max(1, args.workers), args.headers_only)
+    else:
+        problems = validate_export(args.path, args.difficulty)
+
+    for key, errors in problems.items():
+        for error in errors:
+            print(f"[Validate] {key[:8]}: {error}")
+    print(f"[Validate] {'FAILED' if problems else 'OK'} ({len(problems)} invalid entries)")
+    raise SystemExit(1 if problems else 0)